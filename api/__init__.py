@@ -2,4 +2,6 @@ from api.public import publicRouter
 from api.private import privateRouter
 from api.auth import authRouter
 from api.admin import adminRouter
+from api.metrics import metricsRouter, MetricsMiddleware
+from api.health import healthRouter
 from api.exceptions_handlers import register_exception_handlers
\ No newline at end of file
@@ -1,14 +1,21 @@
 from fastapi import APIRouter, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 
-from sqlalchemy import select
+from sqlalchemy import func, select
 from typing import List
 
+from datetime import datetime
 from database import models
+from database.db import sessionmanager
 from schemas.link import LinkGetStatusSchema
-from utils import check_expired, get_link_stats
+from utils import check_expired, get_links_stats, redirect_cache, negative_cache, link_filter, click_buffer, shared_table
+from utils.pagination import paginate, set_next_cursor
+from utils.export import ExportFormat, export_clicks, export_links
+from utils.purge import purge_jobs, start_purge
+from utils.invalidation import evict_links, notify_links_changed, invalidation_listener
 from schemas import *
 
-from api.dependencies import SessionDep, AdminDep
+from api.dependencies import SessionDep, ReadSessionDep, AdminDep
 
 adminRouter = APIRouter(
     prefix="/admin",
@@ -24,33 +31,39 @@ adminRouter = APIRouter(
 @adminRouter.get("/urls")
 async def get_all_short_links(
     admin: AdminDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(500, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetSchema]:
     """
     Get account created short links.
     """
 
-    links = await session.execute(
-        select(models.Link).limit(limit).offset(offset)
-    )
-    return [LinkGetSchema.model_validate(i) for i in links.scalars().all()]
+    db_links = (await session.execute(
+        paginate(select(models.Link), limit, offset, cursor)
+    )).scalars().all()
+    set_next_cursor(response, db_links, limit)
+    return [LinkGetSchema.model_validate(i) for i in db_links]
 
 
 @adminRouter.get("/urls/status")
 async def get_link_status(
     admin: AdminDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(500, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetStatusSchema]:
     """
     Get status of all short link.
     """
     db_links = (await session.execute(
-        select(models.Link).limit(limit).offset(offset)
+        paginate(select(models.Link), limit, offset, cursor)
     )).scalars().all()
+    set_next_cursor(response, db_links, limit)
     return [LinkGetStatusSchema(link=db_link.link, activated=db_link.activated,
                                 expired=await check_expired(db_link), expired_at=db_link.expired_at) for db_link in db_links]
 
@@ -58,32 +71,48 @@ async def get_link_status(
 @adminRouter.get("/urls/stats")
 async def get_all_short_link_stats(
     admin: AdminDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(500, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetSchemaWithStats]:
     """
     Get the statistics of all short links.
     """
     db_links = (await session.execute(
-        select(models.Link).limit(limit).offset(offset)
+        paginate(select(models.Link), limit, offset, cursor)
     )).scalars().all()
+    set_next_cursor(response, db_links, limit)
 
+    links_stats = await get_links_stats([db_link.id for db_link in db_links], session)
     schemStats = []
     for db_link in db_links:
         stats = LinkGetSchemaWithStats.model_validate(db_link)
-        stats.last_hours_clicks, stats.last_day_clicks, stats.last_week_clicks = (await get_link_stats(db_link, session)).values()
+        stats.last_hours_clicks, stats.last_day_clicks, stats.last_week_clicks = links_stats[db_link.id].values()
         schemStats.append(stats)
     schemStats.sort(key=lambda x: x.last_hours_clicks +
                     x.last_day_clicks + x.last_week_clicks, reverse=True)
     return schemStats
 
 
+@adminRouter.get("/urls/export")
+async def export_all_short_links(
+    admin: AdminDep,
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    with_stats: bool = Query(False)
+) -> StreamingResponse:
+    """
+    Stream all short links as NDJSON or CSV, optionally with their total clicks.
+    """
+    return export_links(sessionmanager.read_session, fmt, with_stats)
+
+
 @adminRouter.get("/urls/{url_key}/status")
 async def get_short_link_status(
     url_key: str,
     admin: AdminDep,
-    session: SessionDep
+    session: ReadSessionDep
 ) -> LinkGetStatusSchema:
     """
     Get the status of a short link for the given URL key.
@@ -104,7 +133,7 @@ async def get_short_link_status(
 async def get_short_link_stats(
     url_key: str,
     admin: AdminDep,
-    session: SessionDep
+    session: ReadSessionDep
 ) -> LinkGetSchemaWithStats:
     """
     Get the statistics of a short link for the given URL key.
@@ -121,6 +150,30 @@ async def get_short_link_stats(
     return LinkGetSchemaWithStats.model_validate(db_link)
 
 
+@adminRouter.get("/urls/{url_key}/clicks/export")
+async def export_short_link_clicks(
+    url_key: str,
+    admin: AdminDep,
+    session: ReadSessionDep,
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None)
+) -> StreamingResponse:
+    """
+    Stream the raw clicks of a short link as NDJSON or CSV, optionally within [since, until).
+    """
+    url_key = url_key.strip().upper()
+    db_link = (await session.execute(
+        select(models.Link).filter(models.Link.link == url_key)
+    )).scalar_one_or_none()
+
+    if not db_link:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Link not found")
+
+    return export_clicks(sessionmanager.read_session, db_link, fmt, since, until)
+
+
 @adminRouter.put("/urls/{url_key}/status")
 async def update_short_link_status(
     url_key: str,
@@ -149,7 +202,9 @@ async def update_short_link_status(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Link is already deactivated")
 
     db_link.activated = activated
+    await notify_links_changed(session, [db_link.link])
     await session.commit()
+    evict_links([db_link.link])
     await session.refresh(db_link)
     return LinkGetSchema.model_validate(db_link)
 
@@ -173,7 +228,9 @@ async def delete_short_link(
             status_code=status.HTTP_404_NOT_FOUND, detail="Link not found")
 
     await session.delete(db_link)
+    await notify_links_changed(session, [db_link.link])
     await session.commit()
+    evict_links([db_link.link])
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -182,7 +239,7 @@ async def delete_short_link(
 async def get_user(
     user_name: str,
     admin: AdminDep,
-    session: SessionDep
+    session: ReadSessionDep
 ) -> UserGetSchema:
     """
     Get user information by username.
@@ -202,7 +259,7 @@ async def get_user(
 async def get_user(
     user_id: int,
     admin: AdminDep,
-    session: SessionDep
+    session: ReadSessionDep
 ) -> UserGetSchema:
     """
     Get user information by user ID.
@@ -222,17 +279,20 @@ async def get_user(
 async def get_user_short_links(
     user_id: int,
     admin: AdminDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(500, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetSchema]:
     """
     Get all short links created by a specific user.
     """
     db_links = (await session.execute(
-        select(models.Link).filter(models.Link.owner_id ==
-                                   user_id).limit(limit).offset(offset)
+        paginate(select(models.Link).filter(models.Link.owner_id == user_id),
+                 limit, offset, cursor)
     )).scalars().all()
+    set_next_cursor(response, db_links, limit)
     return [LinkGetSchema.model_validate(db_link) for db_link in db_links]
 
 
@@ -240,17 +300,20 @@ async def get_user_short_links(
 async def get_user_short_link_status(
     user_id: int,
     admin: AdminDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(500, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetStatusSchema]:
     """
     Get the status of all short links created by a specific user.
     """
     db_links = (await session.execute(
-        select(models.Link).filter(models.Link.owner_id ==
-                                   user_id).limit(limit).offset(offset)
+        paginate(select(models.Link).filter(models.Link.owner_id == user_id),
+                 limit, offset, cursor)
     )).scalars().all()
+    set_next_cursor(response, db_links, limit)
 
     return [LinkGetStatusSchema(link=db_link.link, activated=db_link.activated,
                                 expired=await check_expired(db_link), expired_at=db_link.expired_at) for db_link in db_links]
@@ -260,56 +323,98 @@ async def get_user_short_link_status(
 async def get_user_short_link_stats(
     user_id: int,
     admin: AdminDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(500, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetSchemaWithStats]:
     """
     Get the statistics of all short links created by a specific user.
     """
     db_links = (await session.execute(
-        select(models.Link).filter(models.Link.owner_id ==
-                                   user_id).limit(limit).offset(offset)
+        paginate(select(models.Link).filter(models.Link.owner_id == user_id),
+                 limit, offset, cursor)
     )).scalars().all()
+    set_next_cursor(response, db_links, limit)
 
-    return [LinkGetSchemaWithStats.model_validate(db_link) for db_link in db_links]
+    links_stats = await get_links_stats([db_link.id for db_link in db_links], session)
+    schemStats = []
+    for db_link in db_links:
+        stats = LinkGetSchemaWithStats.model_validate(db_link)
+        stats.last_hours_clicks, stats.last_day_clicks, stats.last_week_clicks = links_stats[db_link.id].values()
+        schemStats.append(stats)
+    schemStats.sort(key=lambda x: x.last_hours_clicks +
+                    x.last_day_clicks + x.last_week_clicks, reverse=True)
+    return schemStats
 
 
-@adminRouter.delete("/users/{user_id}/urls")
+@adminRouter.delete("/users/{user_id}/urls", status_code=status.HTTP_202_ACCEPTED)
 async def delete_user_short_links(
+    user_id: int,
+    admin: AdminDep
+) -> PurgeJobSchema:
+    """
+    Start deleting all short links created by a specific user in the background.
+    """
+    job = start_purge(sessionmanager.session, user_id)
+    return PurgeJobSchema.model_validate(job)
+
+
+@adminRouter.get("/users/{user_id}/urls/purge")
+async def get_user_purge_status(
     user_id: int,
     admin: AdminDep,
     session: SessionDep
-) -> Response:
+) -> PurgeStatusSchema:
     """
-    Delete all short links created by a specific user.
+    Get the progress of deleting the short links of a specific user.
+    Job details are only known by the worker running it.
     """
-    await session.delete(
-        select(models.Link).filter(models.Link.owner_id == user_id)
+    remaining = (await session.execute(
+        select(func.count()).select_from(models.Link).filter(models.Link.owner_id == user_id)
+    )).scalar()
+    job = purge_jobs.get(user_id)
+    return PurgeStatusSchema(
+        user_id=user_id,
+        remaining_links=remaining,
+        job=PurgeJobSchema.model_validate(job) if job else None
     )
 
-    await session.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
-
 
-@adminRouter.delete("/users/{user_id}")
+@adminRouter.delete("/users/{user_id}", status_code=status.HTTP_202_ACCEPTED)
 async def delete_user(
     user_id: int,
     admin: AdminDep,
     session: SessionDep
-) -> Response:
+) -> PurgeJobSchema:
     """
-    Delete a user and all their short links.
+    Start deleting a user and all their short links in the background.
     """
     user = (await session.execute(
-        select(models.User).filter(models.User.id == user_id)
+        select(models.User.id).filter(models.User.id == user_id)
     )).scalar_one_or_none()
 
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    await session.delete(user)
-    await session.commit()
+    job = start_purge(sessionmanager.session, user_id, delete_user=True)
+    return PurgeJobSchema.model_validate(job)
 
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@adminRouter.get("/redirect/stats")
+async def get_redirect_stats(
+    admin: AdminDep
+) -> dict:
+    """
+    Get the state of the redirect caches, the shared redirect table, the invalidation listener, the link key filter and the click buffer of this worker.
+    """
+    return {
+        "redirect_cache": {"size": len(redirect_cache), "max_size": redirect_cache.maxsize},
+        "negative_cache": {"size": len(negative_cache), "max_size": negative_cache.maxsize},
+        "shared_table": shared_table.stats,
+        "invalidation_listener": invalidation_listener.stats,
+        "link_filter": link_filter.stats,
+        "click_buffer": click_buffer.stats,
+    }
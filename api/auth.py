@@ -2,9 +2,15 @@ from fastapi import APIRouter, HTTPException, Response, status
 from fastapi import HTTPException, status
 from schemas import *
 
+from sqlalchemy import select
+
+from database import models
+from utils import create_access_token, create_refresh_token, decode_token
+from utils.settings import app_config
+from utils.tokens import REFRESH_TOKEN, password_fingerprint
 from api.dependencies import (
     SessionDep, CredentialsDep, UserDep,
-    get_user, authenticate_user, create_user)
+    get_user, authenticate_basic, create_user)
 
 authRouter = APIRouter(
     prefix="/auth",
@@ -42,12 +48,53 @@ async def login(
     db_session: SessionDep,
     credentials: CredentialsDep
 ) -> UserGetSchema:
-    user = await authenticate_user(
+    user = await authenticate_basic(
         db_session, credentials
     )
     return UserGetSchema.model_validate(user)
 
 
+def issue_tokens(user: models.User) -> TokenSchema:
+    return TokenSchema(
+        access_token=create_access_token(user),
+        refresh_token=create_refresh_token(user),
+        expires_in=app_config.JWT_ACCESS_TTL
+    )
+
+
+@authRouter.post("/token")
+async def get_token(
+    db_session: SessionDep,
+    credentials: CredentialsDep
+) -> TokenSchema:
+    """
+    Exchange Basic credentials for a Bearer access token and a refresh token.
+    """
+    user = await authenticate_basic(db_session, credentials)
+    return issue_tokens(user)
+
+
+@authRouter.post("/refresh")
+async def refresh_token(
+    db_session: SessionDep,
+    data: RefreshTokenSchema
+) -> TokenSchema:
+    """
+    Exchange a refresh token for a new token pair.
+    """
+    claims = decode_token(data.refresh_token, REFRESH_TOKEN)
+    user = None
+    if claims:
+        user = (await db_session.execute(
+            select(models.User).filter(models.User.id == int(claims["sub"]))
+        )).scalar_one_or_none()
+    if not user or claims.get("pwd") != password_fingerprint(user.password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Invalid or expired refresh token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return issue_tokens(user)
+
+
 @authRouter.get("/me")
 async def get_info_about_me(
     user: UserDep
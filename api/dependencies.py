@@ -4,19 +4,27 @@ from sqlalchemy import select, or_
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import (
+    HTTPAuthorizationCredentials,
     HTTPBasic,
     HTTPBasicCredentials,
+    HTTPBearer,
 )
 from typing import Annotated
 
-from utils import verify_password, hash_password, config
-from database import models, get_session
+from utils import check_credentials, hash_password_async, user_from_access_token, config
+from database import models, get_session, get_read_session
 from schemas import *
 
 security = HTTPBasic()
+optional_basic = HTTPBasic(auto_error=False)
+optional_bearer = HTTPBearer(auto_error=False)
 
 CredentialsDep = Annotated[HTTPBasicCredentials, Depends(security)]
+OptionalCredentialsDep = Annotated[HTTPBasicCredentials | None, Depends(optional_basic)]
+BearerDep = Annotated[HTTPAuthorizationCredentials | None, Depends(optional_bearer)]
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
+# Read-only work that tolerates replication lag
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
 
 
 async def get_user(db_session: AsyncSession, username: str, email: str = None) -> models.User | None:
@@ -35,18 +43,40 @@ async def get_user(db_session: AsyncSession, username: str, email: str = None) -
     return user
 
 
-async def authenticate_user(
+async def authenticate_basic(
     db_session: SessionDep,
     credentials: CredentialsDep
 ) -> models.User | None:
     user = await get_user(db_session, credentials.username)
-    if not user or not verify_password(credentials.password, user.password):
+    if not user or not await check_credentials(credentials.username, credentials.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Invalid username or password",
                             headers={"WWW-Authenticate": "Basic"})
     return user
 
 
+async def authenticate_user(
+    db_session: SessionDep,
+    credentials: OptionalCredentialsDep,
+    token: BearerDep
+) -> models.User | None:
+    """
+    Authenticate by a Bearer access token (no database access) or by Basic credentials.
+    """
+    if token:
+        user = user_from_access_token(token.credentials)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Invalid or expired token",
+                                headers={"WWW-Authenticate": "Bearer"})
+        return user
+    elif credentials:
+        return await authenticate_basic(db_session, credentials)
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                        detail="Not authenticated",
+                        headers={"WWW-Authenticate": "Basic"})
+
+
 async def create_user(
     db_session: SessionDep,
     user_data: UserCreateSchema
@@ -54,7 +84,7 @@ async def create_user(
     user = models.User(
         username=user_data.username,
         email=user_data.email,
-        password=hash_password(user_data.password)
+        password=await hash_password_async(user_data.password)
     )
     db_session.add(user)
     await db_session.commit()
@@ -64,14 +94,15 @@ async def create_user(
 
 async def user_is_admin(
     db_session: SessionDep,
-    credentials: CredentialsDep
+    credentials: OptionalCredentialsDep,
+    token: BearerDep
 ) -> models.User | None:
-    user = await get_user(db_session, credentials.username)
-    if not user or not verify_password(credentials.password, user.password):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="Invalid username or password",
-                            headers={"WWW-Authenticate": "Basic"})
-    elif not user.is_admin:
+    user = await authenticate_user(db_session, credentials, token)
+    if token:
+        # Checked against the database, so revoked rights do not last until the token expires
+        user.is_admin = bool(await db_session.scalar(
+            select(models.User.is_admin).filter(models.User.id == user.id)))
+    if not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="You do not have permission to access this resource")
     return user
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from utils.warmup import cache_warmup
+
+healthRouter = APIRouter(
+    prefix="",
+    tags=["health"]
+)
+
+
+@healthRouter.get("/ready")
+async def readiness() -> JSONResponse:
+    """
+    Readiness probe: 503 until the redirect cache warm-up is over.
+    """
+    return JSONResponse(
+        cache_warmup.stats,
+        status_code=200 if cache_warmup.ready else 503
+    )
@@ -0,0 +1,55 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import asyncio
+import time
+
+from utils.metrics import registry, http_requests_total, http_request_duration_seconds
+
+metricsRouter = APIRouter(
+    prefix="",
+    tags=["metrics"]
+)
+
+
+@metricsRouter.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Metrics of all workers in the Prometheus text exposition format.
+    """
+    exposition = await asyncio.to_thread(registry.render, registry.snapshot())
+    return PlainTextResponse(
+        exposition, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class MetricsMiddleware:
+    """
+    Count requests and time them per route template, so that /{url_key}
+    stays one series no matter how many keys are requested.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_requests_total.inc(scope["method"], path, str(status))
+            http_request_duration_seconds.observe(
+                time.perf_counter() - started, scope["method"], path)
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query, Response, status
+from fastapi import APIRouter, Body, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import insert, select
+from typing import Annotated, List
 
 from datetime import datetime, timedelta, timezone
 from database import models
+from database.db import sessionmanager
 from schemas.link import LinkGetStatusSchema
-from utils import generate_short_link, check_expired, get_link_stats
+from utils import generate_short_link, generate_short_links, check_expired, get_link_stats, get_links_stats
+from utils.pagination import paginate, set_next_cursor
+from utils.invalidation import evict_links, notify_links_changed
+from utils.settings import app_config
+from utils.export import ExportFormat, export_clicks
 from schemas import *
 
-from api.dependencies import SessionDep, UserDep
+from api.dependencies import SessionDep, ReadSessionDep, UserDep
 
 privateRouter = APIRouter(
     prefix="/urls",
@@ -25,20 +32,23 @@ privateRouter = APIRouter(
 @privateRouter.get("")
 async def my_short_links(
     user: UserDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(50, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetSchema]:
     """
     Get account created short links.
     """
     if limit > 100:
         limit = 100
-    links = await session.execute(
-        select(models.Link).filter(models.Link.owner_id ==
-                                   user.id).limit(limit).offset(offset)
-    )
-    return [LinkGetSchema.model_validate(i) for i in links.scalars().all()]
+    db_links = (await session.execute(
+        paginate(select(models.Link).filter(models.Link.owner_id == user.id),
+                 limit, offset, cursor)
+    )).scalars().all()
+    set_next_cursor(response, db_links, limit)
+    return [LinkGetSchema.model_validate(i) for i in db_links]
 
 
 @privateRouter.post("")
@@ -61,19 +71,68 @@ async def create_short_link(
             timezone.utc) + timedelta(days=url.expire_days) if url.expire_days else None,
     )
     session.add(new_link)
+    await notify_links_changed(session, [new_link.link], created=True)
     await session.commit()
     await session.refresh(new_link)
+    evict_links([new_link.link], created=True)
 
     response.status_code = status.HTTP_201_CREATED
     return new_link
 
 
+@privateRouter.post("/batch")
+async def create_short_links_batch(
+    urls: Annotated[List[dict], Body(max_length=app_config.LINK_BATCH_MAX_SIZE)],
+    user: UserDep,
+    session: SessionDep,
+    response: Response
+) -> List[LinkBatchItemSchema]:
+    """
+    Create short links for a list of original URLs.
+    Results are returned in input order, invalid items get an error instead of a link.
+    """
+    results = [LinkBatchItemSchema(index=i) for i in range(len(urls))]
+    valid: list[tuple[int, LinkCreateSchema]] = []
+    for i, url in enumerate(urls):
+        try:
+            valid.append((i, LinkCreateSchema.model_validate(url)))
+        except ValidationError as e:
+            results[i].error = "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+    short_links = await generate_short_links(len(valid), session)
+    now = datetime.now(timezone.utc)
+    rows = [{
+        "link": short_link,
+        "original_link": url.original_link,
+        "owner_id": user.id,
+        "expired_at": now + timedelta(days=url.expire_days) if url.expire_days else None,
+    } for short_link, (_, url) in zip(short_links, valid)]
+
+    if rows:
+        db_links = (await session.scalars(
+            insert(models.Link).returning(
+                models.Link, sort_by_parameter_order=True),
+            rows
+        )).all()
+        await notify_links_changed(session, [db_link.link for db_link in db_links], created=True)
+        await session.commit()
+        evict_links((db_link.link for db_link in db_links), created=True)
+        for (i, _), db_link in zip(valid, db_links):
+            results[i].link = LinkGetSchema.model_validate(db_link)
+
+    response.status_code = status.HTTP_201_CREATED
+    return results
+
+
 @privateRouter.get("/status")
 async def get_all_me_short_link_status(
     user: UserDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(50, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetStatusSchema]:
     """
     Get the status of all short links for the authenticated user.
@@ -81,9 +140,10 @@ async def get_all_me_short_link_status(
     if limit > 100:
         limit = 100
     db_links = (await session.execute(
-        select(models.Link).filter(models.Link.owner_id ==
-                                   user.id).limit(limit).offset(offset)
+        paginate(select(models.Link).filter(models.Link.owner_id == user.id),
+                 limit, offset, cursor)
     )).scalars().all()
+    set_next_cursor(response, db_links, limit)
     return [LinkGetStatusSchema(link=db_link.link, activated=db_link.activated,
                                 expired=await check_expired(db_link), expired_at=db_link.expired_at) for db_link in db_links]
 
@@ -91,9 +151,11 @@ async def get_all_me_short_link_status(
 @privateRouter.get("/stats")
 async def get_all_me_short_link_stats(
     user: UserDep,
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     limit: int = Query(50, ge=0),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None)
 ) -> List[LinkGetSchemaWithStats]:
     """
     Get the statistics of all short links for the authenticated user.
@@ -101,14 +163,16 @@ async def get_all_me_short_link_stats(
     if limit > 100:
         limit = 100
     db_links = (await session.execute(
-        select(models.Link).filter(models.Link.owner_id ==
-                                   user.id).limit(limit).offset(offset)
+        paginate(select(models.Link).filter(models.Link.owner_id == user.id),
+                 limit, offset, cursor)
     )).scalars().all()
+    set_next_cursor(response, db_links, limit)
 
+    links_stats = await get_links_stats([db_link.id for db_link in db_links], session)
     schemStats = []
     for db_link in db_links:
         stats = LinkGetSchemaWithStats.model_validate(db_link)
-        stats.last_hours_clicks, stats.last_day_clicks, stats.last_week_clicks = (await get_link_stats(db_link, session)).values()
+        stats.last_hours_clicks, stats.last_day_clicks, stats.last_week_clicks = links_stats[db_link.id].values()
         schemStats.append(stats)
     schemStats.sort(key=lambda x: x.last_hours_clicks +
                     x.last_day_clicks + x.last_week_clicks, reverse=True)
@@ -119,7 +183,7 @@ async def get_all_me_short_link_stats(
 async def get_my_short_link(
     url_key: str,
     user: UserDep,
-    session: SessionDep
+    session: ReadSessionDep
 ) -> LinkGetSchema:
     """
     Get a specific short link created by the user.
@@ -142,7 +206,7 @@ async def get_my_short_link(
 async def get_short_link_status(
     url_key: str,
     user: UserDep,
-    session: SessionDep
+    session: ReadSessionDep
 ) -> LinkGetStatusSchema:
     """
     Get the status of a short link for the given URL key.
@@ -192,7 +256,9 @@ async def update_short_link_status(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Link is already deactivated")
 
     db_link.activated = activated
+    await notify_links_changed(session, [db_link.link])
     await session.commit()
+    evict_links([db_link.link])
     await session.refresh(db_link)
     return LinkGetSchema.model_validate(db_link)
 
@@ -201,7 +267,7 @@ async def update_short_link_status(
 async def get_short_link_stats(
     url_key: str,
     user: UserDep,
-    session: SessionDep
+    session: ReadSessionDep
 ) -> LinkGetSchemaWithStats:
     """
     Get the statistics of a short link for the given URL key.
@@ -220,3 +286,29 @@ async def get_short_link_stats(
     stats = LinkGetSchemaWithStats.model_validate(db_link)
     stats.last_hours_clicks, stats.last_day_clicks, stats.last_week_clicks = (await get_link_stats(db_link, session)).values()
     return stats
+
+
+@privateRouter.get("/{url_key}/clicks/export")
+async def export_short_link_clicks(
+    url_key: str,
+    user: UserDep,
+    session: ReadSessionDep,
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None)
+) -> StreamingResponse:
+    """
+    Stream the raw clicks of a short link as NDJSON or CSV, optionally within [since, until).
+    """
+    url_key = url_key.strip().upper()
+    db_link = (await session.execute(
+        select(models.Link).filter(models.Link.link == url_key)
+    )).scalar_one_or_none()
+    if not db_link:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Link not found")
+    elif db_link.owner_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="You do not have permission to access this link")
+
+    return export_clicks(sessionmanager.read_session, db_link, fmt, since, until)
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy import select
+import asyncio
 
-from database import models
 from schemas import *
 
-from utils import check_expired
-from api.dependencies import SessionDep
+from utils import check_expired, get_redirect_target, redirect_cache, negative_cache, link_filter, shared_table, app_config, CachedLink
+from database.db import sessionmanager
+from utils.invalidation import recently_changed
 from utils.links import add_click
+from utils.metrics import redirect_lookups_total
+from utils.singleflight import SingleFlight
 
 publicRouter = APIRouter(
     prefix="",
@@ -15,35 +17,80 @@ publicRouter = APIRouter(
     responses={404: {"detail": "Url not found"}}
 )
 
+# Concurrent misses for the same key share one database lookup
+redirect_lookups: SingleFlight[CachedLink | None] = SingleFlight()
+
+
+async def load_redirect_target(url_key: str) -> CachedLink | None:
+    """
+    Look a link up in the database and remember the result in the caches.
+    """
+    changed_at = recently_changed.get(url_key)
+    reader = sessionmanager.read_session if changed_at is None else sessionmanager.session
+    async with reader() as db_session:
+        db_url = await get_redirect_target(url_key, db_session)
+        on_replica = db_session.info.get("replica")
+    if db_url is None and on_replica:
+        # The link may be too new to have reached the replica yet
+        async with sessionmanager.session() as db_session:
+            db_url = await get_redirect_target(url_key, db_session)
+    if recently_changed.get(url_key) != changed_at:
+        # Changed while being read, the row may predate the change
+        redirect_lookups_total.inc("db_hit" if db_url else "db_miss")
+        return db_url
+    if db_url:
+        redirect_cache.set(url_key, db_url)
+        shared_table.set(url_key, db_url)
+        redirect_lookups_total.inc("db_hit")
+    else:
+        negative_cache.set(url_key, True)
+        redirect_lookups_total.inc("db_miss")
+    return db_url
+
 
 @publicRouter.get("/{url_key}")
 async def forward_to_target_url(
     url_key: str,
-    request: Request,
-    session: SessionDep
+    request: Request
 ):
     url_key = url_key.strip().upper()
-    async with session as db_session:
-        db_url = (await db_session.execute(
-            select(models.Link)
-            .filter(models.Link.link == url_key)
-        )).scalar_one_or_none()
+    db_url = redirect_cache.get(url_key)
+    if db_url is not None:
+        redirect_lookups_total.inc("cache")
+    elif (db_url := shared_table.get(url_key)) is not None:
+        redirect_lookups_total.inc("shared_table")
+    elif link_filter.rejects(url_key):
+        redirect_lookups_total.inc("filtered")
+    elif negative_cache.get(url_key):
+        redirect_lookups_total.inc("negative_cache")
+    else:
+        if redirect_lookups.in_flight(url_key):
+            redirect_lookups_total.inc("coalesced")
+        try:
+            db_url = await redirect_lookups.do(
+                url_key, lambda: load_redirect_target(url_key), app_config.REDIRECT_LOOKUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Url lookup timed out"
+            )
 
     if not db_url:
         raise HTTPException(
             status_code=404,
             detail="Url not found"
         )
-    elif not db_url.activated:
+    # Checked first, as the sweeper also deactivates expired links
+    elif await check_expired(db_url):
         raise HTTPException(
             status_code=404,
-            detail="Url is deactivated"
+            detail="Url is expired"
         )
-    elif await check_expired(db_url):
+    elif not db_url.activated:
         raise HTTPException(
             status_code=404,
-            detail="Url is expired"
+            detail="Url is deactivated"
         )
 
-    await add_click(db_url, request, db_session)
-    return RedirectResponse(db_url.original_link)
+    await add_click(db_url, request)
+    return RedirectResponse(db_url.target)
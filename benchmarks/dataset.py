@@ -0,0 +1,169 @@
+"""
+Synthetic dataset generator: bulk-loads users, links and clicks with
+Zipf-distributed link popularity into the database configured in .env
+(migrated with alembic). Rows are streamed from generators into COPY, so
+memory stays flat apart from the popularity table. Loaded into the same
+empty database, the output is fully determined by --seed and --now, which
+defaults to the start of the current UTC day and is printed to replay a run.
+Usage:
+
+    python -m benchmarks.dataset --users 10000 --links 1000000 --clicks 100000000
+                                 [--days 30] [--zipf 1.1] [--seed 42] [--now 2026-01-01T00:00:00+00:00]
+"""
+from itertools import accumulate
+from typing import Iterator
+import argparse
+import asyncio
+import bcrypt
+import datetime
+import random
+import time
+
+from sqlalchemy import text
+
+from database.db import sessionmanager
+from utils.keygen import SequenceKeyGenerator
+from utils.partitions import align_partition_start, create_partition_sql, partition_ranges
+from utils.settings import app_config
+
+# Longer than the keys the app generates by default (APP_KEYGEN_LENGTH), so the
+# two never collide
+KEY_LENGTH = 12
+
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 Chrome/124.0 Mobile Safari/537.36",
+    "Googlebot/2.1 (+http://www.google.com/bot.html)",
+)
+
+BCRYPT_ALPHABET = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def seeded_password_hash(password: str, seed: int) -> str:
+    """
+    bcrypt hash of the password with a salt derived from the seed, so it is
+    the same on every run. The last salt character only carries 2 bits.
+    """
+    rnd = random.Random(f"password-{seed}")
+    salt = "".join(rnd.choice(BCRYPT_ALPHABET) for _ in range(21)) + rnd.choice(".Oeu")
+    return bcrypt.hashpw(password.encode('utf-8'), f"$2b$12${salt}".encode()).decode('utf-8')
+
+
+def parse_now(value: str) -> datetime.datetime:
+    now = datetime.datetime.fromisoformat(value)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=datetime.timezone.utc)
+    return now.astimezone(datetime.timezone.utc)
+
+
+def generate_users(first_id: int, count: int, password: str, now: datetime.datetime) -> Iterator[tuple]:
+    for user_id in range(first_id, first_id + count):
+        yield (user_id, f"synthetic_{user_id}", f"synthetic_{user_id}@example.com", password, False, now, now)
+
+
+def generate_links(
+    rnd: random.Random, first_id: int, count: int, owners: tuple[int, int],
+    start: datetime.datetime, span: float, keys: SequenceKeyGenerator
+) -> Iterator[tuple]:
+    for link_id in range(first_id, first_id + count):
+        created = start + datetime.timedelta(seconds=rnd.random() * span)
+        yield (link_id, keys.encode(link_id), f"https://example.com/{link_id}?utm_source=synthetic",
+               rnd.randint(*owners), True, None, created, created)
+
+
+def generate_clicks(
+    rnd: random.Random, count: int, link_ids: list[int], cum_weights: list[float],
+    start: datetime.datetime, span: float, batch: int
+) -> Iterator[tuple]:
+    left = count
+    while left:
+        size = min(batch, left)
+        left -= size
+        for link_id in rnd.choices(link_ids, cum_weights=cum_weights, k=size):
+            created = start + datetime.timedelta(seconds=rnd.random() * span)
+            ip = f"10.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(256)}"
+            yield (link_id, ip, rnd.choice(USER_AGENTS), created, created)
+
+
+async def copy(connection, table: str, columns: list[str], records: Iterator[tuple]) -> None:
+    started = time.perf_counter()
+    await connection.copy_records_to_table(table, columns=columns, records=records)
+    print(f"{table}: loaded in {time.perf_counter() - started:.1f}s")
+
+
+async def main(args) -> None:
+    rnd = random.Random(args.seed)
+    now = args.now or datetime.datetime.now(datetime.timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    print(f"Generating with --seed {args.seed} --now {now.isoformat()}")
+    start = now - datetime.timedelta(days=args.days)
+    span = (now - start).total_seconds()
+
+    async with sessionmanager.connect() as conn:
+        first_user = (await conn.execute(text("SELECT coalesce(max(id), 0) + 1 FROM users"))).scalar()
+        first_link = (await conn.execute(text("SELECT coalesce(max(id), 0) + 1 FROM links"))).scalar()
+
+        # Clicks must land in real partitions, not in the default one
+        days = app_config.CLICKS_PARTITION_DAYS
+        for range_start, range_end in partition_ranges(
+                align_partition_start(start.date(), days), now.date(), days):
+            await conn.execute(text(create_partition_sql(range_start, range_end)))
+
+        raw = (await conn.get_raw_connection()).driver_connection
+
+        await copy(raw, "users",
+                   ["id", "username", "email", "password", "is_admin", "created_at", "updated_at"],
+                   generate_users(first_user, args.users, seeded_password_hash(args.password, args.seed), now))
+
+        keys = SequenceKeyGenerator(KEY_LENGTH, 1, scramble=True, salt=args.seed)
+        await copy(raw, "links",
+                   ["id", "link", "original_link", "owner_id", "activated", "expired_at", "created_at", "updated_at"],
+                   generate_links(rnd, first_link, args.links, (first_user, first_user + args.users - 1),
+                                  start, span, keys))
+
+        # Popularity follows Zipf's law over a seeded random ranking of the links
+        link_ids = list(range(first_link, first_link + args.links))
+        rnd.shuffle(link_ids)
+        cum_weights = list(accumulate(1 / rank ** args.zipf for rank in range(1, args.links + 1)))
+        await copy(raw, "clicks",
+                   ["link_id", "ip", "user_agent", "created_at", "updated_at"],
+                   generate_clicks(rnd, args.clicks, link_ids, cum_weights, start, span, args.batch))
+
+        await conn.execute(text("SELECT setval('users_id_seq', (SELECT max(id) FROM users))"))
+        await conn.execute(text("SELECT setval('links_id_seq', (SELECT max(id) FROM links))"))
+
+        if not args.skip_rollups:
+            started = time.perf_counter()
+            for bucket_size, unit in ((60, "minute"), (3600, "hour")):
+                await conn.execute(text(f"""
+                    INSERT INTO click_rollups (link_id, bucket_size, bucket_start, clicks)
+                    SELECT link_id, {bucket_size},
+                           date_trunc('{unit}', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+                           count(*)
+                    FROM clicks WHERE link_id >= :first_link
+                    GROUP BY 1, 3
+                    ON CONFLICT (link_id, bucket_size, bucket_start)
+                    DO UPDATE SET clicks = click_rollups.clicks + excluded.clicks
+                """), {"first_link": first_link})
+            print(f"click_rollups: built in {time.perf_counter() - started:.1f}s")
+
+    await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--links", type=int, default=100000)
+    parser.add_argument("--clicks", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30, help="Time span the links and clicks are spread over")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of link popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--now", type=parse_now,
+                        help="End of the time span, as an ISO timestamp (UTC unless given), "
+                             "defaults to the start of the current UTC day")
+    parser.add_argument("--batch", type=int, default=100000, help="Clicks sampled per popularity draw")
+    parser.add_argument("--password", default="synthetic-password")
+    parser.add_argument("--skip-rollups", action="store_true", help="Do not build click_rollups for the new clicks")
+    asyncio.run(main(parser.parse_args()))
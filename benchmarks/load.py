@@ -0,0 +1,163 @@
+"""
+Load test of the hot paths, running the FastAPI app in-process over the ASGI
+transport against the database configured in .env (migrated with alembic).
+
+Scenarios: redirect, create, stats, auth_basic, auth_bearer. Each one sends a
+fixed number of requests from a configurable number of concurrent clients and
+reports throughput and p50/p95/p99 latency. Usage:
+
+    python -m benchmarks.load [--scenarios redirect stats] [--concurrency 32]
+                              [--requests 2000] [--output result.json]
+                              [--compare previous.json]
+"""
+from typing import Awaitable, Callable
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import subprocess
+import time
+
+import httpx
+
+from main import app
+
+SCENARIOS = ("redirect", "create", "stats", "auth_basic", "auth_bearer")
+
+Request = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(q * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, request: Request, total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await request(client, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "rps": round(total / duration, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def prepare(client: httpx.AsyncClient, args) -> tuple[httpx.BasicAuth, dict, list[str]]:
+    """
+    Make sure the benchmark user exists and owns a set of links to redirect to.
+    """
+    basic = httpx.BasicAuth(args.username, args.password)
+    await client.post("/auth/register", json={
+        "username": args.username,
+        "email": f"{args.username}@example.com",
+        "password": args.password,
+    })
+    token = (await client.post("/auth/token", auth=basic)).raise_for_status().json()
+    bearer = {"Authorization": f"Bearer {token['access_token']}"}
+
+    created = (await client.post("/urls/batch", headers=bearer, json=[
+        {"original_link": f"https://example.com/bench/{i}"} for i in range(args.links)
+    ])).raise_for_status().json()
+    keys = [item["link"]["link"] for item in created if item["link"]]
+    return basic, bearer, keys
+
+
+async def main(args) -> dict:
+    rnd = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            basic, bearer, keys = await prepare(client, args)
+
+            requests: dict[str, Request] = {
+                "redirect": lambda c, i: c.get(f"/{rnd.choice(keys)}"),
+                "create": lambda c, i: c.post("/urls", headers=bearer, json={
+                    "original_link": f"https://example.com/bench/new/{i}"}),
+                "stats": lambda c, i: c.get("/urls/stats", headers=bearer),
+                "auth_basic": lambda c, i: c.get("/auth/me", auth=basic),
+                "auth_bearer": lambda c, i: c.get("/auth/me", headers=bearer),
+            }
+
+            results = {}
+            for name in args.scenarios:
+                await run_scenario(client, requests[name], args.warmup, args.concurrency)
+                results[name] = await run_scenario(
+                    client, requests[name], args.requests, args.concurrency)
+                print(name, json.dumps(results[name]))
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": commit,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "links": args.links,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(current: dict, previous: dict) -> None:
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        deltas = ", ".join(
+            f"{metric} {before[metric]} -> {result[metric]} ({(result[metric] / before[metric] - 1) * 100:+.1f}%)"
+            for metric in ("rps", "p50_ms", "p99_ms") if before[metric])
+        print(f"{name}: {deltas}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--links", type=int, default=1000)
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Where to save the JSON results")
+    parser.add_argument("--compare", default=None, help="Previous JSON results to compare with")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the per-request CPU cost of the redirect lookup: full ORM
+hydration of models.Link (with HttpUrl parsing of the target) against the
+column projection used by utils.links.get_redirect_target.
+
+Runs on an in-memory SQLite database, so the numbers are Python-side costs
+only (no network round trip). Usage:
+
+    python -m benchmarks.redirect_lookup [--rows 1000] [--repeat 5000]
+"""
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+import argparse
+import json
+import random
+import time
+
+from database import models
+from utils.cache import CachedLink
+from utils.links import redirect_lookup_query
+
+
+def orm_lookup(session: Session, url_key: str) -> str:
+    db_url = session.execute(
+        select(models.Link).filter(models.Link.link == url_key)
+    ).scalar_one_or_none()
+    target = str(db_url.original_link)
+    session.expunge_all()
+    return target
+
+
+def projection_lookup(session: Session, url_key: str) -> str:
+    row = session.execute(redirect_lookup_query, {"url_key": url_key}).one_or_none()
+    return CachedLink(*row).target
+
+
+def measure(func, session: Session, keys: list[str]) -> float:
+    start = time.process_time()
+    for key in keys:
+        func(session, key)
+    return (time.process_time() - start) / len(keys) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(
+        engine, tables=[models.User.__table__, models.Link.__table__])
+    with Session(engine) as session:
+        session.add(models.User(id=1, username="bench", email="bench@example.com", password="-"))
+        session.add_all(models.Link(
+            link=f"KEY{i}", owner_id=1,
+            original_link=f"https://example.com/campaign/{i}?utm_source=bench&utm_medium=redirect"
+        ) for i in range(args.rows))
+        session.commit()
+
+    rnd = random.Random(0)
+    keys = [f"KEY{rnd.randrange(args.rows)}" for _ in range(args.repeat)]
+    with Session(engine) as session:
+        # Warm up statement caches for both paths
+        measure(orm_lookup, session, keys[:100])
+        measure(projection_lookup, session, keys[:100])
+        orm_us = measure(orm_lookup, session, keys)
+        projection_us = measure(projection_lookup, session, keys)
+
+    print(json.dumps({
+        "orm_us_per_lookup": round(orm_us, 2),
+        "projection_us_per_lookup": round(projection_us, 2),
+        "saved_us_per_lookup": round(orm_us - projection_us, 2),
+        "speedup": round(orm_us / projection_us, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
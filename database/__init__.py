@@ -1,2 +1,2 @@
-from database.db import get_session
+from database.db import get_session, get_read_session
 from database.models import *
\ No newline at end of file
@@ -1,32 +1,121 @@
 from utils import config, hash_password
-from sqlalchemy import select
+from utils.metrics import registry, db_queries_total, db_query_duration_seconds, db_pool_exhausted_total
+from sqlalchemy import event, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+import asyncio
 import contextlib
-from typing import Any, AsyncIterator
+import logging
+import time
+from typing import Any, AsyncIterator, Callable
 
 import sys
 import os
 sys.path.append(os.path.join(sys.path[0], '..'))
 
+logger = logging.getLogger(__name__)
+
+# Min seconds between two pool exhaustion warnings of an engine
+POOL_WARNING_INTERVAL = 60.0
+
 
 class DatabaseSessionManager:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
+    """
+    Sessions on the primary database, plus read-only sessions spread
+    round-robin over the replicas. A read session connects on its first
+    statement; a replica that fails to hand out a connection then is skipped
+    for replica_retry_interval seconds, and reads go to the primary while no
+    replica is available.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        engine_kwargs: dict[str, Any] = {},
+        replica_hosts: list[str] = [],
+        replica_retry_interval: float = 30.0
+    ):
         self._engine = create_async_engine(host, **engine_kwargs)
         self._sessionmaker = async_sessionmaker(
             autocommit=False, bind=self._engine, expire_on_commit=False)
+        instrument_engine(self._engine.sync_engine, "primary")
+
+        # Stale connections to a replica that went away are caught on checkout
+        self._replicas: list[AsyncEngine] = [
+            create_async_engine(replica, **{"pool_pre_ping": True, **engine_kwargs})
+            for replica in replica_hosts
+        ]
+        for index, replica in enumerate(self._replicas):
+            instrument_engine(replica.sync_engine, f"replica{index}")
+        self._replica_retry_interval = replica_retry_interval
+        self._replica_down_until = [0.0] * len(self._replicas)
+        self._next_replica = 0
+
+    @property
+    def has_replicas(self) -> bool:
+        return bool(self._replicas)
+
+    def _engines(self) -> dict[str, AsyncEngine]:
+        engines = {f"replica{index}": replica for index, replica in enumerate(self._replicas)}
+        if self._engine is not None:
+            engines["primary"] = self._engine
+        return engines
+
+    def pool_stats(self) -> dict[tuple, float]:
+        """
+        Connection pool state per engine, as exposed by the /metrics gauges.
+        """
+        stats = {}
+        for name, engine in self._engines().items():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            stats.update({
+                (name, "size"): pool.size(),
+                (name, "checked_out"): pool.checkedout(),
+                (name, "checked_in"): pool.checkedin(),
+                (name, "overflow"): max(0, pool.overflow()),
+                (name, "max"): pool.size() + max(0, pool._max_overflow),
+            })
+        return stats
+
+    async def prewarm(self, connections: int) -> None:
+        """
+        Open connections ahead of the first requests, so they do not pay the
+        connect latency. Replicas that cannot be reached are skipped.
+        """
+        async def open_connections(name: str, engine: AsyncEngine) -> None:
+            opened = await asyncio.gather(
+                *(engine.connect() for _ in range(connections)), return_exceptions=True)
+            errors = [result for result in opened if isinstance(result, BaseException)]
+            for connection in opened:
+                if not isinstance(connection, BaseException):
+                    await connection.close()
+            if errors:
+                logger.warning("Failed to prewarm %d connections of the %s pool (%s)",
+                               len(errors), name, errors[0])
+
+        await asyncio.gather(*(open_connections(name, engine)
+                               for name, engine in self._engines().items()))
 
     async def close(self):
         if self._engine is None:
             raise Exception("DatabaseSessionManager is not initialized")
         await self._engine.dispose()
+        for replica in self._replicas:
+            await replica.dispose()
 
         self._engine = None
         self._sessionmaker = None
+        self._replicas = []
 
     @contextlib.asynccontextmanager
     async def connect(self) -> AsyncIterator[AsyncConnection]:
@@ -54,9 +143,134 @@ class DatabaseSessionManager:
         finally:
             await session.close()
 
+    def _connect_replica(self, session: "ReplicaSession") -> Connection | Engine:
+        """
+        Connection to the next healthy replica, or the primary engine if every
+        replica is down. Called by the session on its first statement.
+        """
+        for _ in range(len(self._replicas)):
+            index = self._next_replica
+            self._next_replica = (index + 1) % len(self._replicas)
+            if self._replica_down_until[index] > time.monotonic():
+                continue
+            try:
+                connection = self._replicas[index].sync_engine.connect()
+            except (DBAPIError, OSError, asyncio.TimeoutError) as exc:
+                self._replica_down_until[index] = time.monotonic() + self._replica_retry_interval
+                logger.warning("Replica %d is unavailable (%s), skipping it for %.0fs",
+                               index, exc, self._replica_retry_interval)
+                continue
+            session.info["replica"] = True
+            return connection
+        return self._engine.sync_engine
+
+    @contextlib.asynccontextmanager
+    async def read_session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Session for read-only work. It may lag behind the primary, and
+        session.info["replica"] tells whether it runs on a replica once it
+        has executed a statement.
+        """
+        if self._sessionmaker is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+        if not self._replicas:
+            async with self.session() as session:
+                session.info["replica"] = False
+                yield session
+            return
+
+        session = self._sessionmaker(
+            sync_session_class=ReplicaSession, choose_bind=self._connect_replica,
+            info={"replica": False})
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+class ReplicaSession(Session):
+    """
+    Session that picks its database when it first needs one, not when it is
+    created, so requests that never query (or do slow work first) do not
+    hold a replica connection.
+    """
+
+    def __init__(self, *args, choose_bind: Callable[["ReplicaSession"], Connection | Engine], **kwargs):
+        super().__init__(*args, **kwargs)
+        self._choose_bind = choose_bind
+        self._chosen_bind: Connection | Engine | None = None
+
+    def get_bind(self, *args, **kwargs) -> Connection | Engine:
+        if self._chosen_bind is None:
+            self._chosen_bind = self._choose_bind(self)
+        return self._chosen_bind
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            if isinstance(self._chosen_bind, Connection):
+                self._chosen_bind.close()
+            self._chosen_bind = None
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """
+    Count and time every statement the engine executes, and report when its
+    pool runs out of connections.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries_total.inc(name)
+        db_query_duration_seconds.observe(elapsed, name)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
+
+    last_warning = 0.0
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        nonlocal last_warning
+        pool = engine.pool
+        if not hasattr(pool, "checkedout") or pool.checkedout() < pool.size() + max(0, pool._max_overflow):
+            return
+        db_pool_exhausted_total.inc(name)
+        if time.monotonic() - last_warning > POOL_WARNING_INTERVAL:
+            last_warning = time.monotonic()
+            logger.warning("Connection pool of %s is exhausted, requests wait up to %ss for a connection",
+                           name, pool.timeout())
+
+
+def engine_options() -> dict[str, Any]:
+    pool_size, max_overflow = config.POOL_LIMITS
+    return {
+        "echo": config.DEBUG_SQL,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": config.POOL_TIMEOUT,
+        "pool_recycle": config.POOL_RECYCLE,
+        "pool_pre_ping": config.POOL_PRE_PING,
+        # SQLAlchemy's and asyncpg's own caches of prepared statements
+        "connect_args": {"prepared_statement_cache_size": config.STATEMENT_CACHE_SIZE,
+                         "statement_cache_size": config.STATEMENT_CACHE_SIZE},
+    }
+
 
 sessionmanager = DatabaseSessionManager(
-    config.URL_Postgres, {"echo": config.DEBUG_SQL})
+    config.URL_Postgres, engine_options(),
+    config.URL_Replicas, config.REPLICA_RETRY_INTERVAL)
+
+registry.gauge("db_pool_connections", "Database connection pool state",
+               ("engine", "state"), callback=sessionmanager.pool_stats)
 
 
 async def get_session():
@@ -64,6 +278,11 @@ async def get_session():
         yield session
 
 
+async def get_read_session():
+    async with sessionmanager.read_session() as session:
+        yield session
+
+
 async def test_connection():
     from database import models
     async for session in get_session():
@@ -0,0 +1,94 @@
+"""partition clicks by created_at
+
+Revision ID: 48fb99220c82
+Revises: 8da131d2bf5d
+Create Date: 2026-10-18 15:37:12.630584
+
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '48fb99220c82'
+down_revision: Union[str, None] = '8da131d2bf5d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Fixed here so the migration does not change with the app settings, the
+# partition maintenance creates the following ones with the configured size
+PARTITION_DAYS = 7
+PARTITIONS_AHEAD = 4
+PARTITION_EPOCH = date(1970, 1, 5)
+
+
+def create_partition(start: date, end: date) -> None:
+    op.execute(
+        f"CREATE TABLE clicks_{start:%Y%m%d}_{end:%Y%m%d} PARTITION OF clicks "
+        f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+    )
+
+
+def upgrade() -> None:
+    # Keep the id sequence alive while the old table is replaced
+    op.execute("ALTER SEQUENCE clicks_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE clicks RENAME TO clicks_legacy")
+    op.execute("ALTER TABLE clicks_legacy RENAME CONSTRAINT clicks_pkey TO clicks_legacy_pkey")
+
+    op.execute("""
+        CREATE TABLE clicks (
+            id INTEGER NOT NULL DEFAULT nextval('clicks_id_seq'),
+            link_id INTEGER NOT NULL REFERENCES links (id) ON DELETE CASCADE,
+            ip VARCHAR NOT NULL,
+            user_agent VARCHAR NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.create_index('ix_clicks_link_id_created_at', 'clicks', ['link_id', 'created_at'], unique=False)
+
+    # Partitions from the oldest click up to the configured number of periods ahead,
+    # plus a default partition so a missed maintenance run never rejects clicks
+    today = datetime.now(timezone.utc).date()
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM clicks_legacy")).scalar()
+    first = oldest.date() if oldest else today
+    start = PARTITION_EPOCH + timedelta(days=(first - PARTITION_EPOCH).days // PARTITION_DAYS * PARTITION_DAYS)
+    end = today + timedelta(days=PARTITION_DAYS * PARTITIONS_AHEAD)
+    while start <= end:
+        create_partition(start, start + timedelta(days=PARTITION_DAYS))
+        start += timedelta(days=PARTITION_DAYS)
+    op.execute("CREATE TABLE clicks_default PARTITION OF clicks DEFAULT")
+
+    op.execute("""
+        INSERT INTO clicks (id, link_id, ip, user_agent, created_at, updated_at)
+        SELECT id, link_id, ip, user_agent, created_at, updated_at FROM clicks_legacy
+    """)
+    op.drop_table('clicks_legacy')
+    op.execute("ALTER SEQUENCE clicks_id_seq OWNED BY clicks.id")
+
+
+def downgrade() -> None:
+    op.execute("ALTER SEQUENCE clicks_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE clicks RENAME TO clicks_partitioned")
+    op.execute("ALTER TABLE clicks_partitioned RENAME CONSTRAINT clicks_pkey TO clicks_partitioned_pkey")
+
+    op.create_table('clicks',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('clicks_id_seq')"), nullable=False),
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('ip', sa.String(), nullable=False),
+    sa.Column('user_agent', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO clicks (id, link_id, ip, user_agent, created_at, updated_at)
+        SELECT id, link_id, ip, user_agent, created_at, updated_at FROM clicks_partitioned
+    """)
+    op.execute("DROP TABLE clicks_partitioned CASCADE")
+    op.execute("ALTER SEQUENCE clicks_id_seq OWNED BY clicks.id")
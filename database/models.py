@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Annotated, Optional
 from pydantic import HttpUrl
-from sqlalchemy import MetaData, ForeignKey, DateTime, func, String, TypeDecorator
+from sqlalchemy import MetaData, ForeignKey, DateTime, func, String, TypeDecorator, BigInteger, Index
 from sqlalchemy.orm import DeclarativeBase, relationship
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncAttrs
@@ -65,6 +65,15 @@ class User(Base):
 
 class Link(Base):
     __tablename__ = 'links'
+    __table_args__ = (
+        Index("ix_links_owner_id_id", "owner_id", "id"),
+        Index("ix_links_created_at", "created_at"),
+        # Only links still waiting to be swept by utils.expiration
+        Index("ix_links_expired_at", "expired_at",
+              postgresql_where=expression.and_(
+                  expression.column("activated").is_(True),
+                  expression.column("expired_at").isnot(None))),
+    )
 
     id: Mapped[int_pk]
     link: Mapped[str] = mapped_column(nullable=False, index=True, unique=True)
@@ -79,11 +88,44 @@ class Link(Base):
         DateTime(timezone=True), nullable=True)
 
 
+class LinkKey(Base):
+    """Пул заранее сгенерированных ключей коротких ссылок."""
+    __tablename__ = 'link_keys'
+    __table_args__ = (
+        Index("ix_link_keys_free", "key",
+              postgresql_where=expression.column("reserved").is_(False)),
+    )
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    reserved: Mapped[bool] = mapped_column(
+        server_default=expression.false(), nullable=False)
+
+
 class Click(Base):
+    """Сырые клики, таблица секционирована по created_at (см. utils.partitions)."""
     __tablename__ = 'clicks'
-
-    id: Mapped[int_pk]
+    __table_args__ = (
+        Index("ix_clicks_link_id_created_at", "link_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), primary_key=True)
     link_id: Mapped[int] = mapped_column(ForeignKey(
         "links.id", ondelete="CASCADE"), nullable=False)
     ip: Mapped[str] = mapped_column(nullable=False)
     user_agent: Mapped[str] = mapped_column(nullable=False)
+
+
+class ClickRollup(Base):
+    """Количество кликов по ссылке за интервал времени (bucket_size секунд)."""
+    __tablename__ = 'click_rollups'
+
+    link_id: Mapped[int] = mapped_column(ForeignKey(
+        "links.id", ondelete="CASCADE"), primary_key=True)
+    bucket_size: Mapped[int] = mapped_column(primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True)
+    clicks: Mapped[int] = mapped_column(
+        BigInteger, server_default="0", nullable=False)
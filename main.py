@@ -1,18 +1,79 @@
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api import (
-    publicRouter, privateRouter, authRouter, adminRouter,
-    register_exception_handlers
+    publicRouter, privateRouter, authRouter, adminRouter, metricsRouter, healthRouter,
+    MetricsMiddleware, register_exception_handlers
 )
 
-app = FastAPI()
+from database.db import sessionmanager
+from utils import click_buffer, link_filter, shared_table, app_config, config
+from utils.partitions import run_maintenance
+from utils.expiration import run_sweeper
+from utils.invalidation import invalidation_listener
+from utils.warmup import cache_warmup
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.metrics import registry
+from utils.tokens import check_jwt_secret
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_jwt_secret()
+    await sessionmanager.prewarm(config.POOL_PREWARM or config.POOL_LIMITS[0])
+    click_buffer.start(sessionmanager.session)
+    tasks = [asyncio.create_task(run_maintenance(
+        sessionmanager.session, app_config.CLICKS_MAINTENANCE_INTERVAL)),
+        asyncio.create_task(run_sweeper(
+            sessionmanager.session, app_config.EXPIRATION_SWEEP_INTERVAL, app_config.EXPIRATION_SWEEP_BATCH)),
+        asyncio.create_task(registry.run(app_config.METRICS_FLUSH_INTERVAL))]
+    if app_config.INVALIDATION_ENABLED:
+        tasks.append(asyncio.create_task(invalidation_listener.run()))
+    if app_config.SHARED_TABLE_ENABLED:
+        # Elected before the warm-up, which fills the table only on the writer
+        with suppress(OSError):
+            shared_table.join()
+        tasks.append(asyncio.create_task(shared_table.run(
+            sessionmanager.session, app_config.SHARED_TABLE_REFRESH_INTERVAL,
+            app_config.SHARED_TABLE_TOP_LINKS, app_config.SHARED_TABLE_WINDOW)))
+    if app_config.WARMUP_ENABLED:
+        tasks.append(asyncio.create_task(cache_warmup.run(
+            sessionmanager.read_session,
+            invalidation_listener.resynced if app_config.INVALIDATION_ENABLED else None)))
+    else:
+        cache_warmup.ready = True
+    if app_config.LINK_FILTER_ENABLED and app_config.INVALIDATION_ENABLED:
+        tasks.append(asyncio.create_task(link_filter.run(sessionmanager.session)))
+    elif app_config.LINK_FILTER_ENABLED:
+        logger.warning("Link key filter is not built: it only rejects keys with APP_INVALIDATION_ENABLED")
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await click_buffer.stop()
+    shared_table.close()
+    await sessionmanager.close()
+    registry.write_snapshot()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"]
+    allow_origins=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER]
 )
 
 app.include_router(privateRouter)
+# Registered before the public catch-all /{url_key} route
+app.include_router(metricsRouter)
+app.include_router(healthRouter)
 app.include_router(publicRouter)
 app.include_router(authRouter)
 app.include_router(adminRouter)
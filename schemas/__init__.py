@@ -1,2 +1,4 @@
 from schemas.user import *
-from schemas.link import *
\ No newline at end of file
+from schemas.link import *
+from schemas.token import *
+from schemas.purge import *
\ No newline at end of file
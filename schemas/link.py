@@ -26,6 +26,12 @@ class LinkGetSchemaWithStats(LinkGetSchema):
     last_week_clicks: int = 0
 
 
+class LinkBatchItemSchema(BaseModel):
+    index: int
+    link: LinkGetSchema | None = None
+    error: str | None = None
+
+
 class LinkGetStatusSchema(BaseModel):
     link: str
     activated: bool
@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel
+
+
+class PurgeJobSchema(BaseModel):
+    user_id: int
+    delete_user: bool
+    state: Literal["running", "done", "failed"]
+    links_deleted: int
+    clicks_deleted: int
+    started_at: datetime
+    finished_at: datetime | None
+    error: str | None
+
+    class Config:
+        from_attributes = True
+
+
+class PurgeStatusSchema(BaseModel):
+    user_id: int
+    remaining_links: int
+    job: PurgeJobSchema | None = None
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class TokenSchema(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+
+class RefreshTokenSchema(BaseModel):
+    refresh_token: str
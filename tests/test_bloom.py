@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import datetime
+import unittest
+
+from utils.bloom import BloomFilter, LinkKeyFilter
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class FakeResult:
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+
+class FakeSession:
+    async def execute(self, query):
+        return FakeResult()
+
+
+@contextlib.asynccontextmanager
+async def fake_session_factory():
+    yield FakeSession()
+
+
+def built_filter() -> LinkKeyFilter:
+    link_filter = LinkKeyFilter(1000, 0.001, refresh_interval=0.01, refresh_grace=0)
+    link_filter._filter = BloomFilter(1000, 0.001)
+    link_filter._refreshed_at = utcnow()
+    link_filter.add("KNOWN")
+    return link_filter
+
+
+class LinkKeyFilterTest(unittest.IsolatedAsyncioTestCase):
+    def test_rejects_unknown_keys_with_notifications(self):
+        link_filter = built_filter()
+        link_filter.notified_since = link_filter._refreshed_at - datetime.timedelta(seconds=1)
+
+        self.assertTrue(link_filter.rejects("UNKNOWN"))
+        self.assertFalse(link_filter.rejects("KNOWN"))
+
+    def test_waits_for_a_refresh_after_notifications_start(self):
+        link_filter = built_filter()
+        link_filter.notified_since = link_filter._refreshed_at + datetime.timedelta(seconds=1)
+
+        self.assertFalse(link_filter.rejects("UNKNOWN"))
+
+    def test_rejects_nothing_without_notifications(self):
+        link_filter = built_filter()
+
+        self.assertIsNone(link_filter.notified_since)
+        self.assertFalse(link_filter.rejects("UNKNOWN"))
+
+    async def test_warns_while_refreshing_without_notifications(self):
+        link_filter = built_filter()
+        with self.assertLogs("utils.bloom", "WARNING") as logs:
+            task = asyncio.create_task(link_filter.run(fake_session_factory))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("rejects no keys", logs.output[0])
+
+    async def test_refreshed_filter_rejects_with_notifications(self):
+        link_filter = built_filter()
+        link_filter.notified_since = utcnow()
+        task = asyncio.create_task(link_filter.run(fake_session_factory))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+        self.assertTrue(link_filter.rejects("UNKNOWN"))
+
+
+if __name__ == "__main__":
+    unittest.main()
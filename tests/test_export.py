@@ -0,0 +1,30 @@
+import datetime
+import decimal
+import json
+import unittest
+
+from sqlalchemy.dialects import postgresql
+
+from utils.export import links_export_query, serialize_rows
+
+
+class NdjsonExportTest(unittest.TestCase):
+    def test_total_clicks_is_a_number(self):
+        # asyncpg decodes Postgres numeric as Decimal
+        created = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        row = (1, "ABC", "https://example.com", 1, True, created, None, decimal.Decimal("42"))
+        columns = [column.name for column in links_export_query(with_stats=True).selected_columns]
+
+        record = json.loads(serialize_rows([row], columns, "ndjson"))
+
+        self.assertEqual(record["total_clicks"], 42)
+        self.assertIsInstance(record["total_clicks"], int)
+        self.assertEqual(record["created_at"], created.isoformat())
+
+    def test_total_clicks_is_cast_to_bigint(self):
+        sql = str(links_export_query(with_stats=True).compile(dialect=postgresql.dialect()))
+        self.assertIn("AS BIGINT) AS total_clicks", sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
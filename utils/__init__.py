@@ -1,3 +1,9 @@
-from utils.settings import config
-from utils.passwording import hash_password, verify_password
-from utils.links import generate_short_link, check_expired, add_click, get_link_stats
\ No newline at end of file
+from utils.settings import config, app_config
+from utils.passwording import (
+    hash_password, verify_password, hash_password_async, verify_password_async, check_credentials)
+from utils.links import generate_short_link, generate_short_links, check_expired, add_click, get_link_stats, get_links_stats, get_redirect_target
+from utils.cache import redirect_cache, negative_cache, CachedLink
+from utils.clicks import click_buffer
+from utils.tokens import create_access_token, create_refresh_token, decode_token, user_from_access_token
+from utils.bloom import link_filter
+from utils.shared_table import shared_table
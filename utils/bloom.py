@@ -0,0 +1,168 @@
+from sqlalchemy import select
+from database import models
+from utils.clicks import SessionFactory
+from utils.settings import app_config
+import asyncio
+import datetime
+import hashlib
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, sized for a capacity and a target
+    false positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """
+        False positive rate expected for the number of keys added so far.
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class LinkKeyFilter:
+    """
+    Bloom filter of all existing short link keys, used to reject unknown keys
+    without a database lookup. Until the initial build finishes every key is
+    reported as possibly existing.
+
+    Links created by other workers are picked up by a periodic refresh of
+    recently created rows, and as soon as they are notified while the
+    invalidation listener is connected. Without notifications the filter
+    may lag behind the database, so a miss is only trusted since the first
+    refresh after they started.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, refresh_interval: float, refresh_grace: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.refresh_grace = refresh_grace
+        self._filter: BloomFilter | None = None
+        self._refreshed_at: datetime.datetime | None = None
+        # Since when keys created by other workers are added as notified
+        self.notified_since: datetime.datetime | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def might_contain(self, key: str) -> bool:
+        return self._filter is None or key in self._filter
+
+    def rejects(self, key: str) -> bool:
+        """
+        Whether the key surely does not exist.
+        """
+        if self.notified_since is None or self._refreshed_at is None \
+                or self._refreshed_at < self.notified_since:
+            return False
+        return key not in self._filter
+
+    def add(self, key: str) -> None:
+        if self._filter is not None:
+            self._filter.add(key)
+
+    async def build(self, session_factory: SessionFactory, batch_size: int = 10000) -> None:
+        """
+        Load every link key from the database into a fresh filter.
+        """
+        started = datetime.datetime.now(datetime.timezone.utc)
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        async with session_factory() as session:
+            keys = await session.stream_scalars(
+                select(models.Link.link).execution_options(yield_per=batch_size))
+            async for key in keys:
+                bloom.add(key)
+        # Keys added while the snapshot was loading are replayed by the next refresh
+        self._filter = bloom
+        self._refreshed_at = started
+        logger.info("Link key filter built: %s", self.stats)
+
+    async def refresh(self, session_factory: SessionFactory) -> None:
+        """
+        Add links created since the previous build or refresh.
+        """
+        started = datetime.datetime.now(datetime.timezone.utc)
+        since = self._refreshed_at - datetime.timedelta(seconds=self.refresh_grace)
+        async with session_factory() as session:
+            keys = (await session.execute(
+                select(models.Link.link).filter(models.Link.created_at >= since)
+            )).scalars().all()
+        for key in keys:
+            self._filter.add(key)
+        self._refreshed_at = started
+
+    async def run(self, session_factory: SessionFactory) -> None:
+        """
+        Build the filter, then keep it fresh. Used as a background task of the app.
+        """
+        while not self.ready:
+            try:
+                await self.build(session_factory)
+            except Exception:
+                logger.exception("Failed to build link key filter")
+                await asyncio.sleep(self.refresh_interval)
+        warned = False
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh(session_factory)
+            except Exception:
+                logger.exception("Failed to refresh link key filter")
+            if self.notified_since is None and not warned:
+                logger.warning("Link key filter rejects no keys until link notifications are received")
+            warned = self.notified_since is None
+
+    @property
+    def stats(self) -> dict:
+        if self._filter is None:
+            return {"ready": False}
+        return {
+            "ready": True,
+            "keys": self._filter.count,
+            "capacity": self._filter.capacity,
+            "target_error_rate": self._filter.error_rate,
+            "estimated_error_rate": self._filter.estimated_error_rate,
+            "hashes": self._filter.hashes,
+            "memory_bytes": self._filter.memory_bytes,
+        }
+
+
+link_filter = LinkKeyFilter(
+    app_config.LINK_FILTER_CAPACITY,
+    app_config.LINK_FILTER_ERROR_RATE,
+    app_config.LINK_FILTER_REFRESH_INTERVAL,
+    app_config.LINK_FILTER_REFRESH_GRACE
+)
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Generic, NamedTuple, TypeVar
+import time
+
+from utils.settings import app_config
+
+
+class CachedLink(NamedTuple):
+    """
+    Minimal projection of a link needed to serve a redirect.
+    """
+    id: int
+    target: str
+    activated: bool
+    expired_at: datetime | None
+
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded LRU cache with a per-entry TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: str) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+redirect_cache: TTLCache[CachedLink] = TTLCache(
+    app_config.REDIRECT_CACHE_SIZE, app_config.REDIRECT_CACHE_TTL)
+
+# Links changed lately, with the time of the change. Replicas may still
+# serve their old rows, so they are read from the primary and not reloaded
+# into the caches from older snapshots.
+recently_changed: TTLCache[float] = TTLCache(100000, app_config.INVALIDATION_PRIMARY_READ_TTL)
+
+# Short links recently confirmed missing in the database
+negative_cache: TTLCache[bool] = TTLCache(
+    app_config.NEGATIVE_CACHE_SIZE, app_config.NEGATIVE_CACHE_TTL)
@@ -0,0 +1,200 @@
+from collections import Counter
+from typing import AsyncContextManager, Callable
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import models
+from utils.settings import app_config
+from utils.metrics import registry, clicks_total, click_write_lag_seconds
+import asyncio
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncContextManager[AsyncSession]]
+
+# Sizes (in seconds) of the click_rollups buckets kept up to date on ingestion
+MINUTE_BUCKET = 60
+HOUR_BUCKET = 3600
+DAY_BUCKET = 86400
+ROLLUP_BUCKETS = (MINUTE_BUCKET, HOUR_BUCKET)
+
+
+def bucket_start(ts: datetime.datetime, bucket_size: int) -> datetime.datetime:
+    """
+    Floor the given timestamp to the start of its UTC bucket.
+    """
+    epoch = int(ts.timestamp()) // bucket_size * bucket_size
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+
+
+def rollup_rows(clicks: list[dict]) -> list[dict]:
+    """
+    Aggregate click events into click_rollups rows, sorted by primary key.
+    """
+    counts = Counter(
+        (click["link_id"], size, bucket_start(click["created_at"], size))
+        for click in clicks for size in ROLLUP_BUCKETS
+    )
+    return [
+        {"link_id": link_id, "bucket_size": size,
+            "bucket_start": start, "clicks": n}
+        for (link_id, size, start), n in sorted(counts.items())
+    ]
+
+
+async def upsert_rollups(session: AsyncSession, clicks: list[dict]) -> None:
+    """
+    Add the given clicks to the click_rollups counters.
+    """
+    stmt = pg_insert(models.ClickRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.ClickRollup.link_id,
+                        models.ClickRollup.bucket_size,
+                        models.ClickRollup.bucket_start],
+        set_={"clicks": models.ClickRollup.clicks + stmt.excluded.clicks,
+              "updated_at": func.now()}
+    )
+    await session.execute(stmt, rollup_rows(clicks))
+
+
+class ClickBuffer:
+    """
+    In-memory queue of click events written to the database in batches
+    by a background flusher.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=maxsize)
+        self._session_factory: SessionFactory | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.orphaned = 0
+
+    def put(self, click: dict) -> bool:
+        """
+        Enqueue a click without waiting. Returns False if the event was dropped.
+        """
+        try:
+            self._queue.put_nowait(click)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            clicks_total.inc("dropped")
+            return False
+        return True
+
+    def start(self, session_factory: SessionFactory) -> None:
+        if self._task is not None:
+            return
+        self._session_factory = session_factory
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the flusher after draining everything still queued.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._task
+        self._task = None
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "orphaned": self.orphaned,
+        }
+
+    async def _run(self) -> None:
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._collect()
+            if batch:
+                await self._flush(batch)
+
+    async def _collect(self) -> list[dict]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            if self._stopping:
+                break
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: list[dict]) -> None:
+        async with self._session_factory() as session:
+            await session.execute(insert(models.Click), batch)
+            await upsert_rollups(session, batch)
+            await session.commit()
+
+    async def _drop_orphans(self, batch: list[dict]) -> list[dict]:
+        """
+        Drop clicks of links deleted since they were buffered.
+        """
+        async with self._session_factory() as session:
+            existing = set((await session.scalars(
+                select(models.Link.id).where(
+                    models.Link.id.in_({click["link_id"] for click in batch})))).all())
+        kept = [click for click in batch if click["link_id"] in existing]
+        if len(kept) < len(batch):
+            self.orphaned += len(batch) - len(kept)
+            clicks_total.inc("orphaned", amount=len(batch) - len(kept))
+            logger.info("Dropped %d clicks of deleted links", len(batch) - len(kept))
+        return kept
+
+    async def _flush(self, batch: list[dict]) -> None:
+        try:
+            try:
+                await self._write(batch)
+            except IntegrityError:
+                # A link was deleted while its clicks were buffered, retry
+                # once without them instead of losing the whole batch
+                batch = await self._drop_orphans(batch)
+                if batch:
+                    await self._write(batch)
+        except Exception:
+            self.failed += len(batch)
+            clicks_total.inc("failed", amount=len(batch))
+            logger.exception("Failed to flush %d clicks", len(batch))
+        else:
+            if not batch:
+                return
+            self.flushed += len(batch)
+            clicks_total.inc("flushed", amount=len(batch))
+            oldest = min(click["created_at"] for click in batch)
+            click_write_lag_seconds.observe(
+                (datetime.datetime.now(datetime.timezone.utc) - oldest).total_seconds())
+
+
+click_buffer = ClickBuffer(
+    app_config.CLICK_QUEUE_SIZE,
+    app_config.CLICK_BATCH_SIZE,
+    app_config.CLICK_FLUSH_INTERVAL
+)
+
+registry.gauge("click_queue_size", "Clicks waiting in the buffer to be written",
+               callback=lambda: {(): click_buffer.stats["queued"]})
@@ -0,0 +1,79 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import models
+from utils.invalidation import evict_links, notify_links_changed
+from utils.clicks import SessionFactory
+from utils.settings import app_config
+import asyncio
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def deactivate_expired_batch(session: AsyncSession, now: datetime.datetime, batch_size: int) -> list[str]:
+    """
+    Deactivate up to batch_size links past their expiration date and return
+    their keys. Rows locked by another sweeper are skipped.
+    """
+    expired_ids = (
+        select(models.Link.id)
+        .filter(models.Link.activated.is_(True),
+                models.Link.expired_at.isnot(None),
+                models.Link.expired_at <= now)
+        .order_by(models.Link.expired_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    keys = (await session.execute(
+        update(models.Link)
+        .filter(models.Link.id.in_(expired_ids))
+        .values(activated=False)
+        .returning(models.Link.link)
+    )).scalars().all()
+    await notify_links_changed(session, keys)
+    await session.commit()
+    return list(keys)
+
+
+async def sweep_expired(session_factory: SessionFactory, batch_size: int) -> int:
+    """
+    Deactivate every expired link, one committed batch at a time, and evict
+    them from the redirect cache. Returns the number of links deactivated.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    total = 0
+    while True:
+        async with session_factory() as session:
+            keys = await deactivate_expired_batch(session, now, batch_size)
+        evict_links(keys)
+        total += len(keys)
+        if len(keys) < batch_size:
+            break
+    if total:
+        logger.info("Deactivated %d expired links", total)
+    return total
+
+
+async def run_sweeper(session_factory: SessionFactory, interval: float, batch_size: int) -> None:
+    """
+    Sweep expired links forever, used as a background task of the app.
+    """
+    while True:
+        try:
+            await sweep_expired(session_factory, batch_size)
+        except Exception:
+            logger.exception("Expired links sweep failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from database.db import sessionmanager
+
+    async def main():
+        print(f"Deactivated {await sweep_expired(sessionmanager.session, app_config.EXPIRATION_SWEEP_BATCH)} expired links")
+        await sessionmanager.close()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+from typing import AsyncIterator, Literal, Sequence
+from fastapi.responses import StreamingResponse
+from sqlalchemy import BigInteger, Select, String, cast, func, select, type_coerce
+from database import models
+from utils.clicks import SessionFactory, HOUR_BUCKET, DAY_BUCKET
+import csv
+import datetime
+import decimal
+import io
+import json
+
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_BATCH_SIZE = 5000
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        # Postgres numeric, kept a JSON number
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def serialize_rows(rows: Sequence[Sequence], columns: Sequence[str], fmt: ExportFormat) -> str:
+    """
+    Serialize a batch of rows to NDJSON lines or CSV records.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [value.isoformat() if isinstance(value, datetime.datetime) else value
+             for value in row] for row in rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_default) + "\n"
+        for row in rows)
+
+
+async def stream_rows(
+    session_factory: SessionFactory,
+    query: Select,
+    fmt: ExportFormat,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Run the query through a server-side cursor and serialize it batch by batch,
+    so memory use does not depend on the number of rows.
+    """
+    columns = [column.name for column in query.selected_columns]
+    if fmt == "csv":
+        yield serialize_rows([columns], columns, fmt).encode('utf-8')
+
+    async with session_factory() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield serialize_rows(rows, columns, fmt).encode('utf-8')
+
+
+def export_response(chunks: AsyncIterator[bytes], filename: str, fmt: ExportFormat) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+
+def clicks_export_query(
+    link_id: int,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None
+) -> Select:
+    query = (
+        select(models.Click.id, models.Click.created_at,
+               models.Click.ip, models.Click.user_agent)
+        .filter(models.Click.link_id == link_id)
+        .order_by(models.Click.created_at, models.Click.id)
+    )
+    if since:
+        query = query.filter(models.Click.created_at >= since)
+    if until:
+        query = query.filter(models.Click.created_at < until)
+    return query
+
+
+def export_clicks(
+    session_factory: SessionFactory,
+    link: models.Link,
+    fmt: ExportFormat,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None
+) -> StreamingResponse:
+    """
+    Stream the raw clicks of a link within [since, until) as NDJSON or CSV.
+    """
+    return export_response(
+        stream_rows(session_factory, clicks_export_query(link.id, since, until), fmt),
+        f"{link.link}-clicks", fmt
+    )
+
+
+def links_export_query(with_stats: bool = False) -> Select:
+    columns = [
+        models.Link.id,
+        models.Link.link,
+        type_coerce(models.Link.original_link, String).label("original_link"),
+        models.Link.owner_id,
+        models.Link.activated,
+        models.Link.created_at,
+        models.Link.expired_at,
+    ]
+    if with_stats:
+        # Hour and day rollups together cover the whole click history once.
+        # sum() of a bigint is numeric, cast back so it is exported as a number
+        columns.append(
+            cast(
+                select(func.coalesce(func.sum(models.ClickRollup.clicks), 0))
+                .filter(models.ClickRollup.link_id == models.Link.id,
+                        models.ClickRollup.bucket_size.in_((HOUR_BUCKET, DAY_BUCKET)))
+                .scalar_subquery(),
+                BigInteger
+            ).label("total_clicks")
+        )
+    return select(*columns).order_by(models.Link.id)
+
+
+def export_links(
+    session_factory: SessionFactory,
+    fmt: ExportFormat,
+    with_stats: bool = False
+) -> StreamingResponse:
+    """
+    Stream every link, optionally with its total click count, as NDJSON or CSV.
+    """
+    return export_response(
+        stream_rows(session_factory, links_export_query(with_stats), fmt),
+        "links", fmt
+    )
@@ -0,0 +1,141 @@
+from typing import Iterable
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.bloom import link_filter
+from utils.cache import redirect_cache, negative_cache, recently_changed
+from utils.settings import config, app_config
+from utils.shared_table import shared_table
+import asyncio
+import asyncpg
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "links_changed"
+# Links just created, which cannot be cached anywhere yet but in the negative cache
+CREATED_CHANNEL = "links_created"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD = 7900
+
+
+def evict_links(keys: Iterable[str], created: bool = False) -> None:
+    """
+    Forget everything this worker knows about the given short links, so the
+    next redirect reads them from the database. New links can only be in the
+    negative cache, which spares locking the shared table for them.
+    """
+    changed_at = time.monotonic()
+    for key in keys:
+        recently_changed.set(key, changed_at)
+        redirect_cache.invalidate(key)
+        negative_cache.invalidate(key)
+        if not created:
+            shared_table.invalidate(key)
+        # The key may exist now, a false positive for a removed one is harmless
+        link_filter.add(key)
+
+
+def _payloads(keys: Iterable[str]) -> Iterable[str]:
+    batch, size = [], 0
+    for key in keys:
+        if batch and size + len(key) + 1 > MAX_PAYLOAD:
+            yield ",".join(batch)
+            batch, size = [], 0
+        batch.append(key)
+        size += len(key) + 1
+    if batch:
+        yield ",".join(batch)
+
+
+async def notify_links_changed(db_session: AsyncSession, keys: Iterable[str], created: bool = False) -> None:
+    """
+    Tell every worker to evict the given short links. Must run inside the
+    transaction changing them: Postgres delivers the notification on commit
+    and drops it on rollback.
+    """
+    channel = CREATED_CHANNEL if created else CHANNEL
+    for payload in _payloads(keys):
+        await db_session.execute(select(func.pg_notify(channel, payload)))
+
+
+def resync() -> None:
+    """
+    Drop every cached redirect, after a gap in which notifications may have
+    been missed.
+    """
+    redirect_cache.clear()
+    negative_cache.clear()
+    shared_table.clear()
+
+
+class InvalidationListener:
+    """
+    Keeps one connection listening for link changes and evicts the keys
+    they carry. The connection is checked periodically and reopened when
+    lost, and caches are resynced each time it connects.
+    """
+
+    def __init__(self, dsn: str, ping_interval: float, reconnect_interval: float):
+        self.dsn = dsn
+        self.ping_interval = ping_interval
+        self.reconnect_interval = reconnect_interval
+        self.connected = False
+        self.received = 0
+        self.reconnects = 0
+        # Set once the caches were first resynced, anything loaded after that is kept up to date
+        self.resynced = asyncio.Event()
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        self.received += 1
+        evict_links(payload.split(","), created=channel == CREATED_CHANNEL)
+
+    async def _listen(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        try:
+            await connection.add_listener(CHANNEL, self._on_notify)
+            await connection.add_listener(CREATED_CHANNEL, self._on_notify)
+            # Notifications sent before listening were missed
+            resync()
+            self.connected = True
+            self.resynced.set()
+            link_filter.notified_since = datetime.datetime.now(datetime.timezone.utc)
+            while True:
+                await asyncio.sleep(self.ping_interval)
+                await asyncio.wait_for(connection.fetchval("SELECT 1"), self.ping_interval)
+        finally:
+            self.connected = False
+            link_filter.notified_since = None
+            connection.terminate()
+
+    async def run(self) -> None:
+        """
+        Listen forever. Used as a background task of the app.
+        """
+        while True:
+            try:
+                await self._listen()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                logger.warning("Link invalidation listener disconnected (%s), reconnecting in %.0fs",
+                               exc, self.reconnect_interval)
+            except Exception:
+                logger.exception("Link invalidation listener failed")
+            self.reconnects += 1
+            await asyncio.sleep(self.reconnect_interval)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "received": self.received,
+            "reconnects": self.reconnects,
+        }
+
+
+invalidation_listener = InvalidationListener(
+    make_url(config.URL_Postgres).set(drivername="postgresql").render_as_string(hide_password=False),
+    app_config.INVALIDATION_PING_INTERVAL,
+    app_config.INVALIDATION_RECONNECT_INTERVAL
+)
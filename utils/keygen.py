@@ -0,0 +1,167 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from math import gcd
+from sqlalchemy import Sequence, String, bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import models
+from utils.settings import app_config
+import asyncio
+import secrets
+import string
+
+ALPHABET = string.digits + string.ascii_uppercase
+
+link_key_seq = Sequence("link_key_seq")
+
+
+def encode_base36(number: int, length: int) -> str:
+    """
+    Encode a non-negative number as a fixed-width base36 string.
+    """
+    chars = []
+    for _ in range(length):
+        number, rem = divmod(number, 36)
+        chars.append(ALPHABET[rem])
+    if number:
+        raise ValueError("Number does not fit into the key length")
+    return "".join(reversed(chars))
+
+
+class KeyGenerator(ABC):
+    """
+    Hands out short link keys from an in-memory block, refilling it from the
+    database in bulk so that creating a link needs no lookup.
+    """
+
+    def __init__(self, length: int, block_size: int):
+        self.length = length
+        self.block_size = block_size
+        self._keys: deque[str] = deque()
+        self._lock = asyncio.Lock()
+
+    async def next_key(self, db_session: AsyncSession) -> str:
+        return (await self.next_keys(1, db_session))[0]
+
+    async def next_keys(self, count: int, db_session: AsyncSession) -> list[str]:
+        async with self._lock:
+            while len(self._keys) < count:
+                # Reserve keys in a separate transaction: a rollback of the
+                # caller's session must not release keys still held in memory.
+                async with AsyncSession(db_session.bind) as session:
+                    self._keys.extend(await self._reserve(
+                        session, max(self.block_size, count - len(self._keys))))
+                    await session.commit()
+            return [self._keys.popleft() for _ in range(count)]
+
+    @abstractmethod
+    async def _reserve(self, session: AsyncSession, count: int) -> list[str]:
+        """
+        Take count unused keys for this generator, within the given session.
+        """
+
+
+class SequenceKeyGenerator(KeyGenerator):
+    """
+    Encodes values of a database sequence in base36, optionally scrambled by
+    a bijective affine map so consecutive keys do not look consecutive.
+    """
+
+    MULTIPLIER = 0x5DEECE66D
+
+    def __init__(self, length: int, block_size: int, scramble: bool = True, salt: int = 0):
+        super().__init__(length, block_size)
+        self.space = 36 ** length
+        self.scramble = scramble
+        self.salt = salt % self.space
+        if gcd(self.MULTIPLIER, self.space) != 1:
+            raise ValueError("Scramble multiplier must be coprime with the keyspace")
+
+    def encode(self, number: int) -> str:
+        if number >= self.space:
+            raise ValueError("Short link keyspace is exhausted")
+        if self.scramble:
+            number = (number * self.MULTIPLIER + self.salt) % self.space
+        return encode_base36(number, self.length)
+
+    async def _reserve(self, session: AsyncSession, count: int) -> list[str]:
+        numbers = (await session.execute(
+            select(link_key_seq.next_value()).select_from(
+                func.generate_series(1, count))
+        )).scalars().all()
+        keys = [self.encode(number) for number in numbers]
+
+        # Skip keys already taken by links created before this generator
+        taken = set((await session.execute(
+            select(models.Link.link).filter(models.Link.link.in_(keys))
+        )).scalars().all())
+        return [key for key in keys if key not in taken]
+
+
+class PoolKeyGenerator(KeyGenerator):
+    """
+    Reserves random keys from the pre-generated link_keys pool, refilling the
+    pool in bulk when it runs dry.
+    """
+
+    def __init__(self, length: int, block_size: int, refill_size: int):
+        super().__init__(length, block_size)
+        self.refill_size = refill_size
+
+    async def _reserve(self, session: AsyncSession, count: int) -> list[str]:
+        free = (
+            select(models.LinkKey.key)
+            .filter(models.LinkKey.reserved.is_(False))
+            .limit(count)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        reserve = (
+            update(models.LinkKey)
+            .filter(models.LinkKey.key.in_(free))
+            .values(reserved=True)
+            .returning(models.LinkKey.key)
+        )
+        keys = (await session.execute(reserve)).scalars().all()
+        if not keys:
+            await self.refill(session)
+            keys = (await session.execute(reserve)).scalars().all()
+            if not keys:
+                raise RuntimeError("Short link key pool is exhausted")
+        return list(keys)
+
+    async def refill(self, session: AsyncSession) -> int:
+        """
+        Add new random keys to the pool, skipping ones already used by links.
+        """
+        candidates = list({
+            "".join(secrets.choice(ALPHABET) for _ in range(self.length))
+            for _ in range(self.refill_size)
+        })
+        key = func.unnest(
+            bindparam("candidates", candidates, type_=ARRAY(String))
+        ).column_valued("key")
+        stmt = pg_insert(models.LinkKey).from_select(
+            ["key"],
+            select(key)
+            .filter(~select(models.Link.id).filter(models.Link.link == key).exists())
+        ).on_conflict_do_nothing(index_elements=[models.LinkKey.key])
+        return (await session.execute(stmt)).rowcount
+
+
+def create_key_generator() -> KeyGenerator:
+    if app_config.KEYGEN_MODE == "pool":
+        return PoolKeyGenerator(
+            app_config.KEYGEN_LENGTH,
+            app_config.KEYGEN_BLOCK_SIZE,
+            app_config.KEYGEN_POOL_REFILL_SIZE
+        )
+    return SequenceKeyGenerator(
+        app_config.KEYGEN_LENGTH,
+        app_config.KEYGEN_BLOCK_SIZE,
+        app_config.KEYGEN_SCRAMBLE,
+        app_config.KEYGEN_SALT
+    )
+
+
+key_generator = create_key_generator()
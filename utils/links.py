@@ -1,24 +1,50 @@
-from random import randint
-from sqlalchemy import func, select
+from sqlalchemy import String, and_, bindparam, case, func, or_, select, type_coerce
 from database import models
+from utils.clicks import click_buffer, bucket_start, MINUTE_BUCKET, HOUR_BUCKET
+from utils.keygen import key_generator
+from utils.cache import CachedLink
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Request
 import datetime
-import secrets
-import string
 
 
 async def generate_short_link(original_url: str, db_session: AsyncSession) -> str:
     """
     Generate a short link for the given original URL.
     """
-    short_link = "".join(secrets.choice(
-        string.ascii_uppercase + string.digits) for _ in range(randint(5, 10)))
-    r = (await db_session.execute(select(models.Link).filter(models.Link.link == short_link))).scalar_one_or_none()
-    if not r:
-        return short_link
-    else:
-        return await generate_short_link(original_url, db_session)
+    return await key_generator.next_key(db_session)
+
+
+async def generate_short_links(count: int, db_session: AsyncSession) -> list[str]:
+    """
+    Generate short links for several original URLs at once.
+    """
+    if count == 0:
+        return []
+    return await key_generator.next_keys(count, db_session)
+
+
+# Built once so SQLAlchemy reuses the compiled statement (and asyncpg its
+# prepared statement); type_coerce skips re-parsing the target into HttpUrl.
+redirect_lookup_query = (
+    select(
+        models.Link.id,
+        type_coerce(models.Link.original_link, String),
+        models.Link.activated,
+        models.Link.expired_at
+    )
+    .filter(models.Link.link == bindparam("url_key"))
+)
+
+
+async def get_redirect_target(url_key: str, db_session: AsyncSession) -> CachedLink | None:
+    """
+    Get only the fields needed to serve a redirect for the given URL key.
+    """
+    row = (await db_session.execute(
+        redirect_lookup_query, {"url_key": url_key}
+    )).one_or_none()
+    return CachedLink(*row) if row else None
 
 
 async def check_expired(link: models.Link) -> bool:
@@ -32,62 +58,102 @@ async def check_expired(link: models.Link) -> bool:
     return exp_t < cur_t
 
 
-async def add_click(link: models.Link, request: Request, db_session: AsyncSession) -> None:
+async def add_click(link: models.Link, request: Request) -> None:
     """
-    Add a click record for the given link.
+    Queue a click record for the given link to be written in the background.
     """
-    click = models.Click(
-        link_id=link.id,
-        user_agent=request.headers.get("User-Agent"),
-        ip=request.client.host if request.headers.get("X-Real-IP") is None else request.headers.get("X-Real-IP"),
+    click_buffer.put({
+        "link_id": link.id,
+        "user_agent": request.headers.get("User-Agent", ""),
+        "ip": request.client.host if request.headers.get("X-Real-IP") is None else request.headers.get("X-Real-IP"),
+        "created_at": datetime.datetime.now(datetime.timezone.utc),
+    })
+
+
+STATS_WINDOWS = {
+    "last_hours_clicks": datetime.timedelta(hours=1),
+    "last_day_clicks": datetime.timedelta(days=1),
+    "last_week_clicks": datetime.timedelta(weeks=1),
+}
+
+
+def _window_filter(since: datetime.datetime):
+    """
+    Rollup rows covering [since, now]: minute buckets up to the first full
+    hour and hour buckets after it.
+    """
+    hour_edge = bucket_start(since, HOUR_BUCKET)
+    if hour_edge < since:
+        hour_edge += datetime.timedelta(seconds=HOUR_BUCKET)
+    return or_(
+        and_(models.ClickRollup.bucket_size == MINUTE_BUCKET,
+             models.ClickRollup.bucket_start >= bucket_start(since, MINUTE_BUCKET),
+             models.ClickRollup.bucket_start < hour_edge),
+        and_(models.ClickRollup.bucket_size == HOUR_BUCKET,
+             models.ClickRollup.bucket_start >= hour_edge),
     )
-    db_session.add(click)
-    await db_session.commit()
 
 
-async def get_link_stats(link: models.Link, db_session: AsyncSession) -> dict:
+async def get_links_stats(link_ids: list[int], db_session: AsyncSession) -> dict[int, dict]:
     """
-    Get statistics for the given link.
+    Get statistics for several links at once, keyed by link id.
     """
-    stats = {
-        "last_hours_clicks": 0,
-        "last_day_clicks": 0,
-        "last_week_clicks": 0
-    }
+    stats = {link_id: dict.fromkeys(STATS_WINDOWS, 0) for link_id in link_ids}
+    if not stats:
+        return stats
 
     now = datetime.datetime.now(datetime.timezone.utc)
-    # all_clicks = await db_session.execute(
-    #     select(models.Click).filter(models.Click.link_id == link.id)
-    # )
-
-    # Calculate clicks in the last hour
-    last_hour = now - datetime.timedelta(hours=1)
-    stats["last_hours_clicks"] = (await db_session.execute(
-        select(func.count(models.Click.id))
-        .filter(
-            models.Click.link_id == link.id,
-            models.Click.created_at >= last_hour
-        )
-    )).scalar()
+    filters = {name: _window_filter(now - delta)
+               for name, delta in STATS_WINDOWS.items()}
 
-    # Calculate clicks in the last day
-    last_day = now - datetime.timedelta(days=1)
-    stats["last_day_clicks"] = (await db_session.execute(
-        select(func.count(models.Click.id))
-        .filter(
-            models.Click.link_id == link.id,
-            models.Click.created_at >= last_day
+    rows = (await db_session.execute(
+        select(
+            models.ClickRollup.link_id,
+            *(func.sum(case((window, models.ClickRollup.clicks), else_=0)).label(name)
+              for name, window in filters.items())
         )
-    )).scalar()
-
-    # Calculate clicks in the last week
-    last_week = now - datetime.timedelta(weeks=1)
-    stats["last_week_clicks"] = (await db_session.execute(
-        select(func.count(models.Click.id))
         .filter(
-            models.Click.link_id == link.id,
-            models.Click.created_at >= last_week
+            models.ClickRollup.link_id.in_(stats),
+            or_(*filters.values())
         )
-    )).scalar()
+        .group_by(models.ClickRollup.link_id)
+    )).all()
 
+    for row in rows:
+        stats[row.link_id] = {name: row._mapping[name] for name in STATS_WINDOWS}
     return stats
+
+
+async def get_link_stats(link: models.Link, db_session: AsyncSession) -> dict:
+    """
+    Get statistics for the given link.
+    """
+    return (await get_links_stats([link.id], db_session))[link.id]
+
+
+def top_links_query(since: datetime.datetime, limit: int):
+    """
+    Redirect projections of the active links clicked the most since the given
+    time, most clicked first, keyed by their short link.
+    """
+    top = (
+        select(models.ClickRollup.link_id,
+               func.sum(models.ClickRollup.clicks).label("clicks"))
+        .filter(_window_filter(since))
+        .group_by(models.ClickRollup.link_id)
+        .order_by(func.sum(models.ClickRollup.clicks).desc())
+        .limit(limit)
+        .subquery()
+    )
+    return (
+        select(
+            models.Link.link,
+            models.Link.id,
+            type_coerce(models.Link.original_link, String),
+            models.Link.activated,
+            models.Link.expired_at
+        )
+        .join(top, top.c.link_id == models.Link.id)
+        .filter(models.Link.activated.is_(True))
+        .order_by(top.c.clicks.desc())
+    )
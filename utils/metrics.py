@@ -0,0 +1,260 @@
+from typing import Callable, Iterable
+from utils.settings import app_config
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self) -> dict:
+        return {"values": [[list(k), v] for k, v in self._values.items()]}
+
+
+class Gauge(Metric):
+    """
+    Gauge whose values are read from a callback when metrics are collected.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Callable[[], dict[tuple, float]] | None = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def snapshot(self) -> dict:
+        values = self.callback() if self.callback else {}
+        return {"values": [[list(k), v] for k, v in values.items()]}
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def snapshot(self) -> dict:
+        return {"buckets": list(self.buckets),
+                "values": [[list(k), v] for k, v in self._values.items()]}
+
+
+class MetricsRegistry:
+    """
+    In-process metrics of one worker. Every worker periodically writes a
+    snapshot to a shared directory, and /metrics merges all of them, so the
+    exposition covers every uvicorn worker on the host. Like the
+    multiprocess mode of prometheus_client, the directory should be emptied
+    when the whole app is redeployed.
+
+    Snapshot files are named per process instance, not per pid, so a worker
+    that reuses the pid of an exited one never overwrites its counters.
+    Gauges come from snapshots of live workers written within stale_after
+    seconds.
+    """
+
+    def __init__(self, directory: str | None, stale_after: float):
+        self.directory = directory
+        self.stale_after = stale_after
+        self.metrics: dict[str, Metric] = {}
+        self._instance: tuple[int, str] | None = None
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              callback: Callable[[], dict[tuple, float]] | None = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def _instance_name(self) -> str:
+        # Checked against the pid, so a forked child gets its own name
+        if self._instance is None or self._instance[0] != os.getpid():
+            self._instance = (os.getpid(), f"{os.getpid()}-{uuid.uuid4().hex[:12]}")
+        return self._instance[1]
+
+    def write_snapshot(self, metrics: dict | None = None) -> None:
+        """
+        Write this worker's metrics, or the given snapshot of them, to its file.
+        """
+        if not self.directory:
+            return
+        if metrics is None:
+            metrics = self.snapshot()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self._instance_name()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "time": time.time(), "metrics": metrics}, f)
+        os.replace(path + ".tmp", path)
+
+    async def run(self, interval: float) -> None:
+        """
+        Write snapshots periodically. Used as a background task of the app.
+        """
+        while True:
+            try:
+                # Taken on the event loop, which owns the values, and written in a thread
+                await asyncio.to_thread(self.write_snapshot, self.snapshot())
+            except OSError:
+                logger.exception("Failed to write metrics snapshot")
+            await asyncio.sleep(interval)
+
+    def _snapshots(self, own: dict) -> list[dict]:
+        if not self.directory:
+            return [{"pid": os.getpid(), "time": time.time(), "metrics": own}]
+        self.write_snapshot(own)
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def collect(self, own: dict) -> dict[str, dict[tuple, object]]:
+        """
+        Merge this worker's snapshot with the files of all workers. Counters
+        and histograms of exited workers are kept so totals never go
+        backwards, gauges only come from live ones.
+        """
+        merged: dict[str, dict[tuple, object]] = {name: {} for name in self.metrics}
+        now = time.time()
+        for snapshot in self._snapshots(own):
+            alive = _pid_alive(snapshot["pid"]) and now - snapshot["time"] <= self.stale_after
+            for name, data in snapshot["metrics"].items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.type == "gauge" and not alive):
+                    continue
+                values = merged[name]
+                for labels, value in data["values"]:
+                    labels = tuple(labels)
+                    if metric.type == "histogram":
+                        counts, total = values.get(labels, ([0] * len(value[0]), 0.0))
+                        values[labels] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                    else:
+                        values[labels] = values.get(labels, 0) + value
+        return merged
+
+    def render(self, own: dict) -> str:
+        """
+        Render merged metrics in the Prometheus text exposition format. It
+        reads every worker's file, so it should run in a thread, given this
+        worker's snapshot taken on the event loop.
+        """
+        lines = []
+        for name, values in self.collect(own).items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for labels, value in sorted(values.items()):
+                pairs = list(zip(metric.labelnames, labels))
+                if metric.type == "histogram":
+                    counts, total = value
+                    cumulative = 0
+                    for bound, count in zip((*metric.buckets, math.inf), counts):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(pairs + [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(pairs)} {total}")
+                    lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(pairs)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = MetricsRegistry(
+    app_config.METRICS_DIR or os.path.join(tempfile.gettempdir(), "url-shortener-metrics"),
+    # A few missed writes before a worker's gauges are dropped
+    stale_after=3 * app_config.METRICS_FLUSH_INTERVAL)
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+db_queries_total = registry.counter(
+    "db_queries_total", "SQL statements executed", ("engine",))
+db_query_duration_seconds = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("engine",))
+db_pool_exhausted_total = registry.counter(
+    "db_pool_exhausted_total", "Connection checkouts that left the pool without spare connections", ("engine",))
+bcrypt_duration_seconds = registry.histogram(
+    "bcrypt_duration_seconds", "Time spent hashing or verifying passwords", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0))
+redirect_lookups_total = registry.counter(
+    "redirect_lookups_total", "Redirect lookups by where they were answered", ("result",))
+clicks_total = registry.counter(
+    "clicks_total", "Click events by outcome of buffering and writing", ("outcome",))
+click_write_lag_seconds = registry.histogram(
+    "click_write_lag_seconds", "Age of the oldest click in each written batch",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
@@ -0,0 +1,48 @@
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select
+from database import models
+import base64
+import binascii
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Build an opaque cursor pointing right after the given link id.
+    """
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Get the link id stored in a cursor produced by encode_cursor.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def paginate(query: Select, limit: int, offset: int = 0, cursor: str | None = None) -> Select:
+    """
+    Apply keyset pagination on links.id to the given query. Offset is still
+    honored for compatibility, but only the cursor keeps deep pages cheap.
+    """
+    query = query.order_by(models.Link.id)
+    if cursor:
+        query = query.filter(models.Link.id > decode_cursor(cursor))
+    if offset:
+        query = query.offset(offset)
+    return query.limit(limit)
+
+
+def set_next_cursor(response: Response, db_links: list[models.Link], limit: int) -> None:
+    """
+    Expose the cursor of the next page, if there may be one, in the response headers.
+    """
+    if limit and len(db_links) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            max(db_link.id for db_link in db_links))
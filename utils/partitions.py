@@ -0,0 +1,209 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.clicks import HOUR_BUCKET, DAY_BUCKET, MINUTE_BUCKET, SessionFactory
+from utils.settings import app_config
+import asyncio
+import datetime
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+CLICKS_TABLE = "clicks"
+# Catches clicks outside every range partition, when maintenance fell behind
+DEFAULT_PARTITION = f"{CLICKS_TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{CLICKS_TABLE}_(\d{{8}})_(\d{{8}})$")
+# Partitions are aligned to multiples of the partition size counted from a Monday
+PARTITION_EPOCH = datetime.date(1970, 1, 5)
+# Arbitrary key of the advisory lock serializing maintenance across workers
+MAINTENANCE_LOCK_ID = 0x636C6B73
+
+
+def align_partition_start(day: datetime.date, days: int) -> datetime.date:
+    return PARTITION_EPOCH + datetime.timedelta(
+        days=(day - PARTITION_EPOCH).days // days * days)
+
+
+def partition_ranges(start: datetime.date, end: datetime.date, days: int) -> list[tuple[datetime.date, datetime.date]]:
+    """
+    Consecutive [from, to) partition ranges covering start..end.
+    """
+    ranges = []
+    while start <= end:
+        ranges.append((start, start + datetime.timedelta(days=days)))
+        start = ranges[-1][1]
+    return ranges
+
+
+def partition_name(start: datetime.date, end: datetime.date) -> str:
+    return f"{CLICKS_TABLE}_{start:%Y%m%d}_{end:%Y%m%d}"
+
+
+def create_partition_sql(start: datetime.date, end: datetime.date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start, end)} "
+        f"PARTITION OF {CLICKS_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+    )
+
+
+async def list_partitions(session: AsyncSession) -> list[tuple[str, datetime.date, datetime.date]]:
+    """
+    Range partitions of the clicks table as (name, from, to), oldest first.
+    """
+    names = (await session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": CLICKS_TABLE})).scalars().all()
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            start, end = (datetime.datetime.strptime(
+                g, "%Y%m%d").date() for g in match.groups())
+            partitions.append((name, start, end))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+async def create_partition(session: AsyncSession, start: datetime.date, end: datetime.date) -> None:
+    """
+    Create a range partition. Postgres refuses it while the default partition
+    holds clicks of that range, so those are moved into it, with the default
+    partition detached meanwhile.
+    """
+    bounds = {
+        "start": datetime.datetime.combine(start, datetime.time(), datetime.timezone.utc),
+        "end": datetime.datetime.combine(end, datetime.time(), datetime.timezone.utc),
+    }
+    has_default = (await session.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": DEFAULT_PARTITION})).scalar()
+    stray = has_default and (await session.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+        "WHERE created_at >= :start AND created_at < :end)"
+    ), bounds)).scalar()
+    if not stray:
+        await session.execute(text(create_partition_sql(start, end)))
+        return
+
+    logger.warning("Moving clicks from %s to the new partition %s",
+                   DEFAULT_PARTITION, partition_name(start, end))
+    await session.execute(text(f"ALTER TABLE {CLICKS_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await session.execute(text(create_partition_sql(start, end)))
+    await session.execute(text(
+        f"INSERT INTO {CLICKS_TABLE} (id, link_id, ip, user_agent, created_at, updated_at) "
+        f"SELECT id, link_id, ip, user_agent, created_at, updated_at FROM {DEFAULT_PARTITION} "
+        "WHERE created_at >= :start AND created_at < :end"
+    ), bounds)
+    await session.execute(text(
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end"
+    ), bounds)
+    await session.execute(text(f"ALTER TABLE {CLICKS_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+
+async def create_future_partitions(session: AsyncSession, today: datetime.date) -> list[str]:
+    """
+    Make sure partitions exist for the configured number of periods ahead.
+    """
+    days = app_config.CLICKS_PARTITION_DAYS
+    partitions = await list_partitions(session)
+    start = partitions[-1][2] if partitions else align_partition_start(today, days)
+    end = today + datetime.timedelta(days=days * app_config.CLICKS_PARTITIONS_AHEAD)
+
+    created = []
+    for range_start, range_end in partition_ranges(start, end, days):
+        await create_partition(session, range_start, range_end)
+        created.append(partition_name(range_start, range_end))
+    return created
+
+
+async def drop_expired_partitions(session: AsyncSession, today: datetime.date) -> list[str]:
+    """
+    Drop raw clicks partitions entirely older than the retention period. Their
+    clicks are already counted in click_rollups, which are kept up to date on
+    ingestion, so only raw rows (ip, user agent) are lost.
+    """
+    if not app_config.CLICKS_RETENTION_DAYS:
+        return []
+    cutoff = today - datetime.timedelta(days=app_config.CLICKS_RETENTION_DAYS)
+    dropped = []
+    for name, _, end in await list_partitions(session):
+        if end <= cutoff:
+            await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+async def downsample_rollups(session: AsyncSession, today: datetime.date) -> None:
+    """
+    Fold hour rollups older than their retention into day rollups and drop
+    minute rollups no longer needed by the stats windows.
+    """
+    midnight = datetime.datetime.combine(
+        today, datetime.time(), datetime.timezone.utc)
+    hour_cutoff = midnight - \
+        datetime.timedelta(days=app_config.ROLLUP_HOUR_RETENTION_DAYS)
+    await session.execute(text(
+        "INSERT INTO click_rollups (link_id, bucket_size, bucket_start, clicks) "
+        "SELECT link_id, :day, date_trunc('day', bucket_start AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', sum(clicks) "
+        "FROM click_rollups WHERE bucket_size = :hour AND bucket_start < :cutoff "
+        "GROUP BY 1, 3 "
+        "ON CONFLICT (link_id, bucket_size, bucket_start) "
+        "DO UPDATE SET clicks = click_rollups.clicks + excluded.clicks, updated_at = now()"
+    ), {"day": DAY_BUCKET, "hour": HOUR_BUCKET, "cutoff": hour_cutoff})
+    await session.execute(text(
+        "DELETE FROM click_rollups WHERE bucket_size = :hour AND bucket_start < :cutoff"
+    ), {"hour": HOUR_BUCKET, "cutoff": hour_cutoff})
+
+    minute_cutoff = midnight - \
+        datetime.timedelta(days=app_config.ROLLUP_MINUTE_RETENTION_DAYS)
+    await session.execute(text(
+        "DELETE FROM click_rollups WHERE bucket_size = :minute AND bucket_start < :cutoff"
+    ), {"minute": MINUTE_BUCKET, "cutoff": minute_cutoff})
+
+
+async def maintain_clicks(session: AsyncSession) -> bool:
+    """
+    Run one maintenance pass. Returns False if another worker is running it.
+    """
+    locked = (await session.execute(
+        text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID}
+    )).scalar()
+    if not locked:
+        return False
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    created = await create_future_partitions(session, today)
+    dropped = await drop_expired_partitions(session, today)
+    await downsample_rollups(session, today)
+    await session.commit()
+    logger.info("Clicks maintenance: created %s, dropped %s", created, dropped)
+    return True
+
+
+async def run_maintenance(session_factory: SessionFactory, interval: float) -> None:
+    """
+    Run maintenance passes forever, used as a background task of the app.
+    """
+    while True:
+        try:
+            async with session_factory() as session:
+                await maintain_clicks(session)
+        except Exception:
+            logger.exception("Clicks maintenance failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from database.db import sessionmanager
+
+    async def main():
+        async with sessionmanager.session() as session:
+            if not await maintain_clicks(session):
+                print("Maintenance is already running in another process")
+        await sessionmanager.close()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,9 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import bcrypt
+import hashlib
+import hmac
+import secrets
+import time
 
 import sys
 import os
 sys.path.append(os.path.join(sys.path[0], '..'))
 
+from utils.settings import app_config
+from utils.cache import TTLCache
+from utils.metrics import bcrypt_duration_seconds
+
+# bcrypt releases the GIL, so a small thread pool keeps it off the event loop
+bcrypt_executor = ThreadPoolExecutor(
+    max_workers=app_config.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+# Recently verified credentials, keyed by an HMAC of username, password and the
+# stored hash, so a password change invalidates the entry by itself
+credentials_cache: TTLCache[bool] = TTLCache(
+    app_config.AUTH_CACHE_SIZE, app_config.AUTH_CACHE_TTL)
+_credentials_key = secrets.token_bytes(32)
+
 
 def hash_password(password: str) -> str:
     pwd_bytes = password.encode('utf-8')
@@ -17,6 +37,37 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password=password_byte_enc, hashed_password=hashed_password_byte_enc)
 
 
+async def hash_password_async(password: str) -> str:
+    started = time.perf_counter()
+    hashed = await asyncio.get_running_loop().run_in_executor(
+        bcrypt_executor, hash_password, password)
+    bcrypt_duration_seconds.observe(time.perf_counter() - started, "hash")
+    return hashed
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    started = time.perf_counter()
+    verified = await asyncio.get_running_loop().run_in_executor(
+        bcrypt_executor, verify_password, plain_password, hashed_password)
+    bcrypt_duration_seconds.observe(time.perf_counter() - started, "verify")
+    return verified
+
+
+async def check_credentials(username: str, plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password against its hash, skipping bcrypt for credentials
+    verified recently.
+    """
+    key = hmac.new(_credentials_key, "\0".join(
+        (username, plain_password, hashed_password)).encode('utf-8'), hashlib.sha256).hexdigest()
+    if credentials_cache.get(key):
+        return True
+    verified = await verify_password_async(plain_password, hashed_password)
+    if verified:
+        credentials_cache.set(key, True)
+    return verified
+
+
 if __name__ == "__main__":
     # Example usage
     password = "my_secure_password"
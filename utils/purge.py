@@ -0,0 +1,124 @@
+from sqlalchemy import delete, select, tuple_
+from database import models
+from utils.invalidation import evict_links, notify_links_changed
+from utils.clicks import SessionFactory
+from utils.settings import app_config
+import asyncio
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeJob:
+    """
+    Background deletion of all links of a user, and optionally the user,
+    done in bounded batches each committed on its own so that no statement
+    holds locks for long.
+    """
+
+    def __init__(self, user_id: int, delete_user: bool, link_batch_size: int, row_batch_size: int):
+        self.user_id = user_id
+        self.delete_user = delete_user
+        self.link_batch_size = link_batch_size
+        self.row_batch_size = row_batch_size
+        self.state = "running"
+        self.links_deleted = 0
+        self.clicks_deleted = 0
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.finished_at: datetime.datetime | None = None
+        self.error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.state == "running"
+
+    def start(self, session_factory: SessionFactory) -> None:
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def _run(self, session_factory: SessionFactory) -> None:
+        try:
+            while await self._purge_batch(session_factory):
+                pass
+            if self.delete_user:
+                async with session_factory() as session:
+                    await session.execute(delete(models.User).filter(models.User.id == self.user_id))
+                    await session.commit()
+        except Exception as exc:
+            self.state = "failed"
+            self.error = str(exc)
+            logger.exception("Purge of user %d links failed", self.user_id)
+        else:
+            self.state = "done"
+            logger.info("Purged %d links and %d clicks of user %d",
+                        self.links_deleted, self.clicks_deleted, self.user_id)
+        finally:
+            self.finished_at = datetime.datetime.now(datetime.timezone.utc)
+
+    async def _purge_batch(self, session_factory: SessionFactory) -> bool:
+        """
+        Delete the next batch of links with their clicks and rollups.
+        Returns False once the user has no links left.
+        """
+        async with session_factory() as session:
+            links = (await session.execute(
+                select(models.Link.id, models.Link.link)
+                .filter(models.Link.owner_id == self.user_id)
+                .order_by(models.Link.id)
+                .limit(self.link_batch_size)
+            )).all()
+        if not links:
+            return False
+        link_ids = [link.id for link in links]
+
+        self.clicks_deleted += await self._delete_rows(
+            session_factory, models.Click, (models.Click.id, models.Click.created_at), link_ids)
+        await self._delete_rows(
+            session_factory, models.ClickRollup,
+            (models.ClickRollup.link_id, models.ClickRollup.bucket_size, models.ClickRollup.bucket_start),
+            link_ids)
+
+        async with session_factory() as session:
+            # Clicks written meanwhile are removed by the cascade
+            await session.execute(delete(models.Link).filter(models.Link.id.in_(link_ids)))
+            await notify_links_changed(session, [link.link for link in links])
+            await session.commit()
+        evict_links(link.link for link in links)
+        self.links_deleted += len(links)
+        return True
+
+    async def _delete_rows(self, session_factory: SessionFactory, model, key_columns: tuple, link_ids: list[int]) -> int:
+        deleted = 0
+        while True:
+            async with session_factory() as session:
+                chunk = (
+                    select(*key_columns)
+                    .filter(model.link_id.in_(link_ids))
+                    .limit(self.row_batch_size)
+                )
+                result = await session.execute(
+                    delete(model).filter(tuple_(*key_columns).in_(chunk)))
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.row_batch_size:
+                return deleted
+
+
+# Purges started by this worker, by user id
+purge_jobs: dict[int, PurgeJob] = {}
+
+
+def start_purge(session_factory: SessionFactory, user_id: int, delete_user: bool = False) -> PurgeJob:
+    """
+    Start purging the links of a user, unless this worker is already doing it.
+    """
+    job = purge_jobs.get(user_id)
+    if job is not None and job.running:
+        job.delete_user = job.delete_user or delete_user
+        return job
+    job = PurgeJob(user_id, delete_user,
+                   app_config.PURGE_LINK_BATCH_SIZE, app_config.PURGE_ROW_BATCH_SIZE)
+    purge_jobs[user_id] = job
+    job.start(session_factory)
+    return job
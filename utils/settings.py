@@ -1,5 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
+from typing import Literal
+import os
 
 
 class SettingsBase(BaseSettings):
@@ -21,6 +23,33 @@ class Settings(SettingsBase):
 
     DEBUG_SQL: bool = Field(False, description="Enable SQL debug mode")
 
+    REPLICA_HOSTS: str = Field(
+        "", description="Comma separated host[:port] of read replicas, sharing the primary's credentials")
+    REPLICA_RETRY_INTERVAL: float = Field(
+        30.0, gt=0, description="Seconds a failed replica is skipped before being tried again")
+
+    # Same default as the number of uvicorn workers
+    WORKERS: int = Field(
+        default_factory=lambda: int(os.environ.get("WEB_CONCURRENCY") or 1), ge=1,
+        description="Number of app worker processes sharing the connection budget")
+    CONNECTION_BUDGET: int = Field(
+        0, ge=0, description="Connections all workers may open to the primary and replicas together, "
+                             "used to size pools (0 disables it)")
+    POOL_SIZE: int | None = Field(
+        None, ge=1, description="Connections kept open per engine of a worker, derived from the budget when unset")
+    MAX_OVERFLOW: int | None = Field(
+        None, ge=0, description="Extra connections opened per engine of a worker under load, "
+                                "derived from the budget when unset")
+    POOL_TIMEOUT: float = Field(10.0, gt=0, description="Seconds to wait for a free pooled connection")
+    POOL_RECYCLE: int = Field(
+        1800, ge=-1, description="Seconds after which pooled connections are reopened (-1 disables it)")
+    POOL_PRE_PING: bool = Field(True, description="Check pooled connections are alive before using them")
+    POOL_PREWARM: int = Field(
+        0, ge=0, description="Connections opened per engine at startup (0 opens the whole pool size)")
+    STATEMENT_CACHE_SIZE: int = Field(
+        100, ge=0, description="Prepared statements cached per connection by SQLAlchemy and by asyncpg "
+                               "(0 for pgbouncer transaction mode)")
+
     @property
     def URL_SQLite(self):
         return f"sqlite+aiosqlite:///./database.db"
@@ -29,12 +58,176 @@ class Settings(SettingsBase):
     def URL_Postgres(self):
         return f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.DB}"
 
+    @property
+    def POOL_LIMITS(self) -> tuple[int, int]:
+        """
+        Pool size and overflow of each engine of one worker. Unset values are
+        split from the worker's share of the connection budget, a quarter of it
+        as overflow. The share leaves out the worker's notification connection,
+        opened outside the pools, and is divided between the primary and
+        replica pools.
+        """
+        listener = 1 if app_config.INVALIDATION_ENABLED else 0
+        engines = 1 + len(self.URL_Replicas)
+        share = max(0, self.CONNECTION_BUDGET // self.WORKERS - listener) // engines
+        if self.MAX_OVERFLOW is not None:
+            max_overflow = self.MAX_OVERFLOW
+        else:
+            max_overflow = share // 4 if self.CONNECTION_BUDGET else 10
+        if self.POOL_SIZE is not None:
+            pool_size = self.POOL_SIZE
+        else:
+            pool_size = max(1, share - max_overflow) if self.CONNECTION_BUDGET else 5
+        return pool_size, max_overflow
+
+    @property
+    def URL_Replicas(self) -> list[str]:
+        urls = []
+        for replica in filter(None, map(str.strip, self.REPLICA_HOSTS.split(","))):
+            host, _, port = replica.partition(":")
+            urls.append(f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{host}:{port or self.PORT}/{self.DB}")
+        return urls
+
     @classmethod
     def load(cls) -> "Settings":
         return cls()
 
 
+class AppSettings(SettingsBase):
+    model_config = SettingsConfigDict(env_prefix="APP_")
+
+    REDIRECT_CACHE_SIZE: int = Field(
+        10000, ge=0, description="Max number of links kept in the redirect cache (0 disables it)")
+    REDIRECT_CACHE_TTL: float = Field(
+        60.0, ge=0, description="Seconds a redirect cache entry stays valid")
+
+    REDIRECT_LOOKUP_TIMEOUT: float = Field(
+        5.0, gt=0, description="Seconds a redirect waits for its database lookup before answering 503")
+
+    WARMUP_ENABLED: bool = Field(
+        True, description="Preload the redirect cache with the most clicked links at startup")
+    WARMUP_TOP_LINKS: int = Field(
+        10000, ge=0, description="Number of most clicked links preloaded at startup")
+    WARMUP_WINDOW: float = Field(
+        21600.0, gt=0, description="Seconds of click history ranking the links to preload")
+    WARMUP_BUDGET: float = Field(
+        10.0, gt=0, description="Max seconds spent preloading before the worker reports ready")
+    WARMUP_BATCH_SIZE: int = Field(
+        1000, ge=1, description="Number of links fetched from the database at once while preloading")
+
+    NEGATIVE_CACHE_SIZE: int = Field(
+        100000, ge=0, description="Max number of missing short links remembered (0 disables it)")
+    NEGATIVE_CACHE_TTL: float = Field(
+        5.0, ge=0, description="Seconds a missing short link is answered without the database")
+
+    SHARED_TABLE_ENABLED: bool = Field(
+        True, description="Share hot redirects between the workers of a host through a memory-mapped table")
+    SHARED_TABLE_PATH: str = Field(
+        "", description="File backing the shared redirect table (empty uses /dev/shm or a temp directory)")
+    SHARED_TABLE_CAPACITY: int = Field(
+        65536, ge=32, description="Number of slots of the shared redirect table")
+    SHARED_TABLE_SLOT_SIZE: int = Field(
+        256, ge=64, description="Bytes per slot, links with longer targets are not shared")
+    SHARED_TABLE_TTL: float = Field(
+        60.0, gt=0, description="Seconds a shared redirect entry stays valid")
+    SHARED_TABLE_REFRESH_INTERVAL: float = Field(
+        10.0, gt=0, description="Seconds between reloads of the most clicked links into the shared table")
+    SHARED_TABLE_TOP_LINKS: int = Field(
+        20000, ge=0, description="Number of most clicked links kept in the shared table")
+    SHARED_TABLE_WINDOW: float = Field(
+        3600.0, gt=0, description="Seconds of click history ranking the most clicked links")
+
+    INVALIDATION_ENABLED: bool = Field(
+        True, description="Evict links changed by other workers as Postgres notifications arrive")
+    INVALIDATION_PING_INTERVAL: float = Field(
+        5.0, gt=0, description="Seconds between health checks of the notification connection")
+    INVALIDATION_RECONNECT_INTERVAL: float = Field(
+        1.0, gt=0, description="Seconds to wait before reopening a lost notification connection")
+    INVALIDATION_PRIMARY_READ_TTL: float = Field(
+        10.0, ge=0, description="Seconds a changed link is read from the primary, should exceed the replica lag")
+
+    LINK_FILTER_ENABLED: bool = Field(
+        True, description="Reject unknown short links with an in-memory Bloom filter")
+    LINK_FILTER_CAPACITY: int = Field(
+        10_000_000, ge=1, description="Number of links the Bloom filter is sized for")
+    LINK_FILTER_ERROR_RATE: float = Field(
+        0.001, gt=0, lt=1, description="Target false positive rate of the Bloom filter at capacity")
+    LINK_FILTER_REFRESH_INTERVAL: float = Field(
+        2.0, gt=0, description="Seconds between loads of links created by other workers into the filter")
+    LINK_FILTER_REFRESH_GRACE: float = Field(
+        30.0, ge=0, description="Overlap of filter refreshes, covers links committed late")
+
+    CLICK_QUEUE_SIZE: int = Field(
+        100000, ge=1, description="Max number of clicks buffered before new ones are dropped")
+    CLICK_BATCH_SIZE: int = Field(
+        500, ge=1, description="Max number of clicks written in one insert")
+    CLICK_FLUSH_INTERVAL: float = Field(
+        1.0, gt=0, description="Max seconds a click waits in the buffer before being written")
+
+    BCRYPT_WORKERS: int = Field(
+        2, ge=1, description="Number of threads hashing and verifying passwords")
+    AUTH_CACHE_SIZE: int = Field(
+        10000, ge=0, description="Max number of recently verified credentials kept (0 disables it)")
+    AUTH_CACHE_TTL: float = Field(
+        30.0, ge=0, description="Seconds verified credentials are trusted without bcrypt")
+
+    JWT_SECRET: str = Field(
+        "", description="Key signing access tokens, required and shared by all workers")
+    JWT_ALGORITHM: str = Field("HS256", description="Algorithm signing access tokens")
+    JWT_ACCESS_TTL: int = Field(900, ge=1, description="Access token lifetime in seconds")
+    JWT_REFRESH_TTL: int = Field(
+        1209600, ge=1, description="Refresh token lifetime in seconds")
+
+    LINK_BATCH_MAX_SIZE: int = Field(
+        10000, ge=1, description="Max number of links created by one batch request")
+
+    CLICKS_PARTITION_DAYS: int = Field(
+        7, ge=1, description="Time range covered by one clicks partition, in days")
+    CLICKS_PARTITIONS_AHEAD: int = Field(
+        4, ge=1, description="Number of future clicks partitions kept created in advance")
+    CLICKS_RETENTION_DAYS: int = Field(
+        90, ge=0, description="Days raw clicks are kept before their partition is dropped (0 keeps them forever)")
+    ROLLUP_MINUTE_RETENTION_DAYS: int = Field(
+        8, ge=8, description="Days per-minute rollups are kept, must cover the weekly stats window")
+    ROLLUP_HOUR_RETENTION_DAYS: int = Field(
+        90, ge=8, description="Days per-hour rollups are kept before being downsampled to per-day rollups")
+    CLICKS_MAINTENANCE_INTERVAL: float = Field(
+        3600.0, gt=0, description="Seconds between clicks partition maintenance runs")
+
+    EXPIRATION_SWEEP_INTERVAL: float = Field(
+        60.0, gt=0, description="Seconds between sweeps deactivating expired links")
+    EXPIRATION_SWEEP_BATCH: int = Field(
+        1000, ge=1, description="Max number of expired links deactivated per transaction")
+
+    PURGE_LINK_BATCH_SIZE: int = Field(
+        1000, ge=1, description="Number of links deleted per transaction when purging a user")
+    PURGE_ROW_BATCH_SIZE: int = Field(
+        10000, ge=1, description="Number of clicks or rollups deleted per transaction when purging a user")
+
+    KEYGEN_MODE: Literal["sequence", "pool"] = Field(
+        "sequence", description="Short link key source: base36-encoded sequence or pre-generated pool")
+    KEYGEN_LENGTH: int = Field(7, ge=4, le=12, description="Length of generated short link keys")
+    KEYGEN_BLOCK_SIZE: int = Field(
+        100, ge=1, description="Number of keys each worker reserves from the database at once")
+    KEYGEN_SCRAMBLE: bool = Field(
+        True, description="Scramble sequence values so keys are not guessable in order")
+    KEYGEN_SALT: int = Field(0, ge=0, description="Offset mixed into scrambled sequence keys")
+    KEYGEN_POOL_REFILL_SIZE: int = Field(
+        10000, ge=1, description="Number of random keys added when the key pool runs dry")
+
+    METRICS_DIR: str = Field(
+        "", description="Directory where workers share metric snapshots (empty uses a temp directory)")
+    METRICS_FLUSH_INTERVAL: float = Field(
+        5.0, gt=0, description="Seconds between metric snapshots written by each worker")
+
+    @classmethod
+    def load(cls) -> "AppSettings":
+        return cls()
+
+
 config = Settings.load()
+app_config = AppSettings.load()
 
 if __name__ == '__main__':
     print(config)
+    print(app_config)
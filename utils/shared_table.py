@@ -0,0 +1,342 @@
+from typing import Iterator
+from utils.cache import CachedLink, recently_changed
+from utils.clicks import SessionFactory
+from utils.links import top_links_query
+from utils.settings import app_config
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, the table is disabled there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"URLSHT01"
+# magic, capacity, slot size, generation
+HEADER = struct.Struct("<8sQIQ")
+GENERATION = struct.Struct("<Q")
+GENERATION_OFFSET = 20
+SLOTS_OFFSET = 64
+# state, key length, target length, link id, activated, expired_at, valid until
+SLOT = struct.Struct("<BBHqBdd")
+EMPTY, USED, DELETED = 0, 1, 2
+# Linear probing gives up after this many slots, so lookups stay bounded
+MAX_PROBES = 32
+# Reads retried while the writer is changing the table
+READ_ATTEMPTS = 3
+
+
+class SharedRedirectTable:
+    """
+    Redirect table in a memory-mapped file shared by all workers of a host.
+
+    Open addressing with linear probing over fixed-size slots. One worker,
+    holding an exclusive lock on a side file, is the writer: it fills the
+    table with the most clicked links and its own lookups. The others only
+    read it, and remove the entries of links they changed. Changes are
+    serialized by a second lock file, and every change bumps a generation
+    counter to odd before and back to even after (a seqlock), so readers
+    retry a lookup that saw an odd or changed generation. Entries expire
+    after a TTL, like the per-worker redirect cache.
+    """
+
+    def __init__(self, path: str, capacity: int, slot_size: int, ttl: float):
+        self.path = path
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self.writer = False
+        self._mm: mmap.mmap | None = None
+        self._inode: int | None = None
+        self._lock_fd: int | None = None
+        self._write_lock_fd: int | None = None
+
+    @property
+    def size_bytes(self) -> int:
+        return SLOTS_OFFSET + self.capacity * self.slot_size
+
+    def _slot_offset(self, index: int) -> int:
+        return SLOTS_OFFSET + index * self.slot_size
+
+    def _home(self, key: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") % self.capacity
+
+    def _generation(self) -> int:
+        return GENERATION.unpack_from(self._mm, GENERATION_OFFSET)[0]
+
+    def _bump_generation(self) -> None:
+        GENERATION.pack_into(self._mm, GENERATION_OFFSET, self._generation() + 1)
+
+    @contextlib.contextmanager
+    def _changing(self) -> Iterator[None]:
+        """
+        Hold the right to change the table, shared by all workers, and mark
+        the change in the generation counter.
+        """
+        if self._write_lock_fd is None:
+            self._write_lock_fd = os.open(self.path + ".write.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._write_lock_fd, fcntl.LOCK_EX)
+        try:
+            if self._generation() & 1:
+                # A worker died halfway through a change
+                self._bump_generation()
+                self._clear_slots()
+                self._bump_generation()
+            self._bump_generation()
+            try:
+                yield
+            finally:
+                self._bump_generation()
+        finally:
+            fcntl.flock(self._write_lock_fd, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> CachedLink | None:
+        if self._mm is None:
+            return None
+        raw_key = key.encode('utf-8')
+        for _ in range(READ_ATTEMPTS):
+            generation = self._generation()
+            if generation & 1:
+                continue
+            entry = self._lookup(raw_key)
+            if self._generation() != generation:
+                continue
+            if entry is None:
+                return None
+            # Decoded only once the copy is known to be consistent
+            link_id, raw_target, activated, expired_at = entry
+            try:
+                return CachedLink(
+                    link_id, raw_target.decode('utf-8'), bool(activated),
+                    None if math.isnan(expired_at)
+                    else datetime.datetime.fromtimestamp(expired_at, datetime.timezone.utc))
+            except (UnicodeDecodeError, ValueError, OverflowError, OSError):
+                return None
+        return None
+
+    def _lookup(self, raw_key: bytes) -> tuple[int, bytes, int, float] | None:
+        """
+        Raw fields of the entry of a key, copied out of the table. They may
+        be torn if the table changed meanwhile.
+        """
+        home = self._home(raw_key)
+        now = time.time()
+        for probe in range(MAX_PROBES):
+            offset = self._slot_offset((home + probe) % self.capacity)
+            state, key_len, target_len, link_id, activated, expired_at, valid_until = \
+                SLOT.unpack_from(self._mm, offset)
+            if state == EMPTY:
+                return None
+            start = offset + SLOT.size
+            if state != USED or self._mm[start:start + key_len] != raw_key:
+                continue
+            if valid_until < now:
+                return None
+            return link_id, self._mm[start + key_len:start + key_len + target_len], activated, expired_at
+        return None
+
+    def _find_slot(self, raw_key: bytes) -> tuple[int | None, int | None]:
+        """
+        Offsets of the slot holding the key and of the first reusable slot
+        along its probe sequence.
+        """
+        home = self._home(raw_key)
+        now = time.time()
+        free = None
+        for probe in range(MAX_PROBES):
+            offset = self._slot_offset((home + probe) % self.capacity)
+            state, key_len, _, _, _, _, valid_until = SLOT.unpack_from(self._mm, offset)
+            start = offset + SLOT.size
+            if state == USED and self._mm[start:start + key_len] == raw_key:
+                return offset, free
+            if free is None and (state != USED or valid_until < now):
+                free = offset
+            if state == EMPTY:
+                break
+        return None, free
+
+    def set(self, key: str, link: CachedLink) -> bool:
+        """
+        Store a link, if this worker is the writer and the link fits in a slot.
+        """
+        if not self.writer:
+            return False
+        raw_key, raw_target = key.encode('utf-8'), link.target.encode('utf-8')
+        if len(raw_key) > 255 or SLOT.size + len(raw_key) + len(raw_target) > self.slot_size:
+            return False
+        expired_at = link.expired_at.replace(tzinfo=datetime.timezone.utc).timestamp() \
+            if link.expired_at else math.nan
+
+        with self._changing():
+            found, free = self._find_slot(raw_key)
+            offset = found if found is not None else free
+            if offset is None:
+                return False
+            SLOT.pack_into(self._mm, offset, USED, len(raw_key), len(raw_target), link.id,
+                           link.activated, expired_at, time.time() + self.ttl)
+            start = offset + SLOT.size
+            self._mm[start:start + len(raw_key) + len(raw_target)] = raw_key + raw_target
+        return True
+
+    def invalidate(self, key: str) -> None:
+        """
+        Remove a link. Any worker can, so that changes handled by a reader
+        do not keep being served from the table.
+        """
+        if self._mm is None or fcntl is None:
+            return
+        raw_key = key.encode('utf-8')
+        with self._changing():
+            found, _ = self._find_slot(raw_key)
+            if found is not None:
+                self._mm[found] = DELETED
+
+    def clear(self) -> None:
+        if not self.writer:
+            return
+        with self._changing():
+            self._clear_slots()
+
+    def _clear_slots(self) -> None:
+        for index in range(self.capacity):
+            self._mm[self._slot_offset(index)] = EMPTY
+
+    def _try_become_writer(self) -> bool:
+        if fcntl is None:
+            return False
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+
+        if not self._valid_file():
+            # Built aside and swapped in, so readers never map a partial file
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.truncate(self.size_bytes)
+                f.write(HEADER.pack(MAGIC, self.capacity, self.slot_size, 0))
+            os.replace(tmp_path, self.path)
+        self._map()
+        self.writer = True
+        logger.info("Worker %d owns the shared redirect table %s", os.getpid(), self.path)
+        return True
+
+    def _valid_file(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(HEADER.size)
+                size = os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return False
+        return (len(header) == HEADER.size and size == self.size_bytes
+                and HEADER.unpack(header)[:3] == (MAGIC, self.capacity, self.slot_size))
+
+    def _map(self) -> None:
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            mm = mmap.mmap(fd, self.size_bytes, access=mmap.ACCESS_WRITE)
+            inode = os.fstat(fd).st_ino
+        finally:
+            os.close(fd)
+        if self._mm is not None:
+            self._mm.close()
+        self._mm, self._inode = mm, inode
+
+    def _attach(self) -> None:
+        """
+        Map the writer's table, again if the writer replaced it.
+        """
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return
+        if inode != self._inode and self._valid_file():
+            self._map()
+
+    def join(self) -> None:
+        """
+        Take the writer role if it is free, otherwise map the writer's table.
+        """
+        if not self.writer and not self._try_become_writer():
+            self._attach()
+
+    async def refresh(self, session_factory: SessionFactory, top_links: int, window: float) -> int:
+        """
+        Store the links clicked the most within the last window seconds.
+        """
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=window)
+        stored = 0
+        async with session_factory() as session:
+            rows = await session.stream(
+                top_links_query(since, top_links).execution_options(yield_per=1000))
+            async for key, *link in rows:
+                if recently_changed.get(key) is not None:
+                    # Evicted while streaming, the row may predate the change
+                    continue
+                stored += self.set(key, CachedLink(*link))
+        return stored
+
+    async def run(self, session_factory: SessionFactory, interval: float, top_links: int, window: float) -> None:
+        """
+        Compete for the writer role and, once holding it, keep the hottest
+        links fresh in the table. Used as a background task of the app.
+        """
+        while True:
+            try:
+                self.join()
+                if self.writer:
+                    await self.refresh(session_factory, top_links, window)
+            except Exception:
+                logger.exception("Shared redirect table update failed")
+            await asyncio.sleep(interval)
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+            self._inode = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        if self._write_lock_fd is not None:
+            os.close(self._write_lock_fd)
+            self._write_lock_fd = None
+        self.writer = False
+
+    @property
+    def stats(self) -> dict:
+        if self._mm is None:
+            return {"attached": False}
+        used = sum(self._mm[self._slot_offset(index)] == USED for index in range(self.capacity))
+        return {
+            "attached": True,
+            "writer": self.writer,
+            "generation": self._generation(),
+            "used_slots": used,
+            "capacity": self.capacity,
+            "memory_bytes": self.size_bytes,
+        }
+
+
+shared_table = SharedRedirectTable(
+    app_config.SHARED_TABLE_PATH or os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        "url-shortener-redirects"),
+    app_config.SHARED_TABLE_CAPACITY,
+    app_config.SHARED_TABLE_SLOT_SIZE,
+    app_config.SHARED_TABLE_TTL
+)
@@ -0,0 +1,41 @@
+from typing import Awaitable, Callable, Generic, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls for the same key into one: callers arriving
+    while a call is in flight await its result or exception instead of
+    starting their own.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task[T]] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]], timeout: float) -> T:
+        """
+        Run fn for the key, or join the call already running. A caller that
+        times out or is cancelled stops waiting, but the shared call keeps
+        running for the others.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def _finish(self, key: str, task: asyncio.Task[T]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every caller gave up
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._calls)
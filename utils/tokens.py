@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+from database import models
+from utils.settings import app_config
+import hashlib
+import hmac
+import jwt
+
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+# Value of APP_JWT_SECRET in old copies of .env.example
+PLACEHOLDER_SECRET = "change-me"
+
+
+def check_jwt_secret() -> None:
+    """
+    Refuse to run with a missing or publicly known signing key: anyone could
+    mint tokens, and a per-process random one would differ between workers.
+    """
+    if app_config.JWT_SECRET in ("", PLACEHOLDER_SECRET):
+        raise RuntimeError("APP_JWT_SECRET must be set to a secret shared by all workers")
+
+
+def password_fingerprint(hashed_password: str) -> str:
+    """
+    Short keyed digest of the stored password hash, used to revoke refresh
+    tokens when the password changes.
+    """
+    return hmac.new(app_config.JWT_SECRET.encode('utf-8'),
+                    hashed_password.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+
+def _encode(claims: dict, token_type: str, ttl: int) -> str:
+    now = datetime.now(timezone.utc)
+    claims.update(type=token_type, iat=now, exp=now + timedelta(seconds=ttl))
+    return jwt.encode(claims, app_config.JWT_SECRET, algorithm=app_config.JWT_ALGORITHM)
+
+
+def create_access_token(user: models.User) -> str:
+    """
+    Create a short-lived token carrying everything needed to authorize a request.
+    """
+    return _encode({
+        "sub": str(user.id),
+        "username": user.username,
+        "email": user.email,
+        "adm": user.is_admin,
+        "crt": user.created_at.isoformat(),
+    }, ACCESS_TOKEN, app_config.JWT_ACCESS_TTL)
+
+
+def create_refresh_token(user: models.User) -> str:
+    """
+    Create a long-lived token that can only be exchanged for a new token pair.
+    """
+    return _encode({
+        "sub": str(user.id),
+        "pwd": password_fingerprint(user.password),
+    }, REFRESH_TOKEN, app_config.JWT_REFRESH_TTL)
+
+
+def decode_token(token: str, token_type: str) -> dict | None:
+    """
+    Validate the token signature, expiry and type. Returns its claims or None.
+    """
+    try:
+        claims = jwt.decode(token, app_config.JWT_SECRET, algorithms=[app_config.JWT_ALGORITHM],
+                            options={"require": ["sub", "type", "exp"]})
+    except jwt.InvalidTokenError:
+        return None
+    if claims["type"] != token_type:
+        return None
+    return claims
+
+
+def user_from_access_token(token: str) -> models.User | None:
+    """
+    Build a detached user from access token claims without touching the database.
+    """
+    claims = decode_token(token, ACCESS_TOKEN)
+    if claims is None:
+        return None
+    return models.User(
+        id=int(claims["sub"]),
+        username=claims["username"],
+        email=claims["email"],
+        is_admin=claims["adm"],
+        created_at=datetime.fromisoformat(claims["crt"]),
+    )
@@ -0,0 +1,83 @@
+from utils.cache import CachedLink, redirect_cache, recently_changed
+from utils.clicks import SessionFactory
+from utils.links import top_links_query
+from utils.settings import app_config
+from utils.shared_table import shared_table
+import asyncio
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmup:
+    """
+    Preloads the redirect caches with the links clicked the most recently,
+    so a fresh worker does not send its first minutes of traffic to the
+    database. The worker reports ready once it is done or out of time.
+    """
+
+    def __init__(self, top_links: int, window: float, budget: float, batch_size: int):
+        self.top_links = top_links
+        self.window = window
+        self.budget = budget
+        self.batch_size = batch_size
+        self.ready = False
+        self.loaded = 0
+        self.timed_out = False
+        self.duration: float | None = None
+
+    async def _load(self, session_factory: SessionFactory, after: asyncio.Event | None) -> None:
+        if after is not None:
+            # A resync of the caches would throw the warmed links away
+            await after.wait()
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.window)
+        # More links than the cache holds would only evict each other
+        limit = min(self.top_links, redirect_cache.maxsize)
+        async with session_factory() as session:
+            result = await session.stream(
+                top_links_query(since, limit).execution_options(yield_per=self.batch_size))
+            async for rows in result.partitions():
+                for key, *link in rows:
+                    if recently_changed.get(key) is not None:
+                        # The replica may not have the change yet
+                        continue
+                    link = CachedLink(*link)
+                    redirect_cache.set(key, link)
+                    shared_table.set(key, link)
+                self.loaded += len(rows)
+
+    async def run(self, session_factory: SessionFactory, after: asyncio.Event | None = None) -> None:
+        """
+        Warm up within the time budget, once the after event is set if
+        given. Used as a background task of the app.
+        """
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._load(session_factory, after), self.budget)
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            logger.warning("Redirect cache warm-up ran out of its %.0fs budget", self.budget)
+        except Exception:
+            logger.exception("Redirect cache warm-up failed")
+        self.duration = time.perf_counter() - started
+        self.ready = True
+        logger.info("Redirect cache warmed up with %d links in %.2fs", self.loaded, self.duration)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "loaded": self.loaded,
+            "timed_out": self.timed_out,
+            "duration_s": self.duration,
+        }
+
+
+cache_warmup = CacheWarmup(
+    app_config.WARMUP_TOP_LINKS,
+    app_config.WARMUP_WINDOW,
+    app_config.WARMUP_BUDGET,
+    app_config.WARMUP_BATCH_SIZE
+)